@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Fixtures for the benchmark suite.
+
+Event sizes can be tuned through environment variables, for example::
+
+    BENCH_PROJECTS=200 BENCH_USERS=800 python -m pytest benchmarks
+"""
+
+import os
+import time
+
+import pytest
+from sqlalchemy import event as sa_event
+
+from dribdat.extensions import cache
+from tests.conftest import app, testapp, db
+
+from .synthetic import make_event
+
+BENCH_PROJECTS = int(os.environ.get('BENCH_PROJECTS', 20))
+BENCH_USERS = int(os.environ.get('BENCH_USERS', 40))
+BENCH_ACTIVITIES = int(os.environ.get('BENCH_ACTIVITIES', 200))
+# Ratio in size between the "small" and the "large" event
+BENCH_SCALE = int(os.environ.get('BENCH_SCALE', 4))
+BENCH_ROUNDS = int(os.environ.get('BENCH_ROUNDS', 3))
+
+# Fixtures shared with the test suite
+__all__ = ['app', 'testapp', 'db']
+
+# Collected over the session, printed in the terminal summary
+RESULTS = []
+
+
+class Measure(object):
+    """Count the queries and wall time of a callable."""
+
+    def __init__(self, db):
+        """Attach to the database engine."""
+        self.db = db
+        self.count = 0
+        self.queries = None
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+    def __call__(self, name, func, *args, **kwargs):
+        """Run a function for a few cold rounds, return the last result."""
+        engine = self.db.engine
+        timings = []
+        queries = None
+        result = None
+        for _ in range(BENCH_ROUNDS):
+            # Start each round cold: no cached values, no loaded rows
+            cache.clear()
+            self.db.session.expire_all()
+            self.count = 0
+            sa_event.listen(engine, 'before_cursor_execute', self._on_execute)
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                timings.append(time.perf_counter() - started)
+                sa_event.remove(
+                    engine, 'before_cursor_execute', self._on_execute)
+            if queries is None:
+                queries = self.count
+        RESULTS.append((name, queries, min(timings)))
+        self.queries = queries
+        return result
+
+
+@pytest.fixture
+def measure(db):
+    """Benchmark helper recording query count and best wall time."""
+    return Measure(db)
+
+
+@pytest.fixture
+def events(db):
+    """Create a small and a large synthetic event, to compare scaling."""
+    small = make_event(
+        'Small', BENCH_PROJECTS, BENCH_USERS, BENCH_ACTIVITIES)
+    large = make_event(
+        'Large', BENCH_PROJECTS * BENCH_SCALE, BENCH_USERS * BENCH_SCALE,
+        BENCH_ACTIVITIES * BENCH_SCALE)
+    return small, large
+
+
+def pytest_terminal_summary(terminalreporter):
+    """Print a table of the benchmark results."""
+    if not RESULTS:
+        return
+    tr = terminalreporter
+    tr.section('dribdat benchmarks')
+    width = max(len(r[0]) for r in RESULTS)
+    tr.write_line('%s  %8s  %10s' % ('Name'.ljust(width), 'Queries', 'ms'))
+    for name, queries, seconds in RESULTS:
+        tr.write_line('%s  %8d  %10.2f' % (
+            name.ljust(width), queries, seconds * 1000))
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Generators of synthetic event data for benchmarks."""
+
+import datetime as dt
+import random
+
+from dribdat.database import db
+from dribdat.user.models import User, Role, Event, Project, Activity
+
+# A README-sized block of text, used to fill the large text columns
+LOREM = (
+    "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do "
+    "eiusmod tempor incididunt ut labore et dolore magna aliqua. "
+) * 40
+
+ROLE_NAMES = ['Developer', 'Designer', 'Data scientist', 'Facilitator']
+
+
+def make_event(name='Benchmark', projects=20, users=40, activities=200,
+               seed=42):
+    """Create an event with projects, a user base and their activities."""
+    rnd = random.Random(seed)
+    now = dt.datetime.utcnow()
+    event = Event(
+        name=name,
+        summary="A synthetic event",
+        description=LOREM,
+        starts_at=now - dt.timedelta(days=2),
+        ends_at=now - dt.timedelta(days=1),
+    )
+    db.session.add(event)
+
+    roles = Role.query.all()
+    if not roles:
+        roles = [Role(name=r) for r in ROLE_NAMES]
+        db.session.add_all(roles)
+
+    userlist = []
+    for i in range(users):
+        user = User(
+            username='%s-user-%d' % (name.lower(), i),
+            email='%s-user-%d@example.com' % (name.lower(), i),
+            active=True,
+        )
+        user.roles = rnd.sample(roles, rnd.randint(0, 2))
+        userlist.append(user)
+    db.session.add_all(userlist)
+
+    projectlist = []
+    for i in range(projects):
+        project = Project(
+            name='%s project %d' % (name, i),
+            summary="Synthetic project %d" % i,
+            longtext=LOREM,
+            autotext=LOREM,
+            image_url='https://example.com/%d.png' % i,
+            progress=rnd.choice([-1, 0, 5, 10, 20, 30]),
+            score=rnd.randint(0, 100),
+        )
+        project.event = event
+        project.user = rnd.choice(userlist) if userlist else None
+        projectlist.append(project)
+    db.session.add_all(projectlist)
+    db.session.commit()
+
+    # Every user joins a team, the remaining activities are posts
+    for ix, user in enumerate(userlist):
+        if not projectlist:
+            break
+        project = projectlist[ix % len(projectlist)]
+        db.session.add(Activity(
+            'star', project.id, user_id=user.id,
+            timestamp=event.starts_at))
+    for i in range(max(activities - len(userlist), 0)):
+        if not projectlist:
+            break
+        project = rnd.choice(projectlist)
+        db.session.add(Activity(
+            rnd.choice(['update', 'review']), project.id,
+            user_id=rnd.choice(userlist).id if userlist else None,
+            action='post',
+            content='Synthetic post %d' % i,
+            project_progress=project.progress,
+            timestamp=event.starts_at + dt.timedelta(minutes=i),
+        ))
+    db.session.commit()
+    return event
+
+
+def busiest_project(event):
+    """Return the project of an event with the most activities."""
+    return Project.query.filter_by(event_id=event.id).join(
+        Activity, Activity.project_id == Project.id
+    ).group_by(Project.id).order_by(
+        db.func.count(Activity.id).desc()
+    ).first()
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""Micro-benchmark of the boxout template rendering."""
+
+import pystache
+
+from dribdat.boxout import render_box
+from dribdat.boxout.dribdat import TEMPLATE_PROJECT
+
+# Number of boxes rendered per round
+BOXES = 500
+
+PROJECT = {
+    'link': 'http://localhost/project/1',
+    'name': 'A project',
+    'summary': 'Something <useful>',
+    'phase': 'Prototype',
+    'progress': 20,
+    'is_challenge': False,
+    'image_url': 'https://example.com/1.png',
+}
+
+
+class TestBoxout:
+    """Compare parsing templates per box to the shared registry."""
+
+    def test_render_box(self, measure):
+        """Render many project boxes."""
+        unparsed = measure(
+            'pystache.render x%d' % BOXES,
+            lambda: [pystache.render(TEMPLATE_PROJECT, PROJECT)
+                     for _ in range(BOXES)])
+        parsed = measure(
+            'render_box x%d' % BOXES,
+            lambda: [render_box('project', PROJECT) for _ in range(BOXES)])
+        assert parsed == unparsed
+        assert '&lt;useful&gt;' in parsed[0]
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks of the hot paths of an event site."""
+
+from flask import url_for
+
+from dribdat.user.models import Project
+from dribdat.aggregation import GetEventUsers
+from dribdat.apiutils import get_project_list, gen_csv
+from dribdat.apipackage import PackageEvent
+from dribdat.onebox import make_oembedplus, get_oembed_providers
+from dribdat.public.projhelper import project_page_data
+
+from .synthetic import busiest_project
+
+
+def event_text(event):
+    """Compose a description which links to every project of an event."""
+    home = url_for('public.home', _external=True)
+    lines = ['Welcome to %s' % event.name, '']
+    for p in Project.query.filter_by(event_id=event.id):
+        lines.append('%sproject/%d' % (home, p.id))
+        lines.append('Some text about the project.')
+    lines.append('https://github.com/dribdat/dribdat')
+    return '\n'.join(lines)
+
+
+class TestHotPaths:
+    """Measure each path on a small and a large event."""
+
+    def test_project_data(self, events, measure):
+        """Serialize every project of an event."""
+        for event in events:
+            data = measure(
+                'Project.data [%s]' % event.name,
+                lambda: [p.data for p in Project.query.filter_by(
+                    event_id=event.id)])
+            assert len(data) > 0
+
+    def test_all_dribs(self, events, measure):
+        """Build the timeline of the busiest project."""
+        for event in events:
+            project = busiest_project(event)
+            dribs = measure(
+                'all_dribs [%s]' % event.name, project.all_dribs)
+            assert len(dribs) > 0
+
+    def test_event_users(self, events, measure):
+        """Collect the participants of an event."""
+        queries = set()
+        for event in events:
+            users = measure(
+                'GetEventUsers [%s]' % event.name, GetEventUsers, event)
+            assert len(users) > 0
+            queries.add(measure.queries)
+        # Independent of the number of projects and members
+        assert len(queries) == 1
+
+    def test_project_page(self, events, measure):
+        """Assemble the project page of the busiest project for its team."""
+        queries = set()
+        for event in events:
+            project = busiest_project(event)
+            member = project.get_team()[0]
+            page = measure(
+                'project_page_data [%s]' % event.name,
+                project_page_data, project, member)
+            assert page['project_starred']
+            queries.add(measure.queries)
+        # Independent of the size of the team and timeline
+        assert len(queries) == 1
+
+    def test_project_list(self, events, measure):
+        """Collect the project list of an event."""
+        for event in events:
+            projects = measure(
+                'get_project_list [%s]' % event.name,
+                get_project_list, event.id, 'http://localhost/', True)
+            assert len(projects) > 0
+
+    def test_package_event(self, events, measure):
+        """Generate the Data Package of an event."""
+        for event in events:
+            package = measure(
+                'PackageEvent [%s]' % event.name,
+                PackageEvent, event, None, 'http://localhost/')
+            assert package.title == event.name
+
+    def test_oembedplus(self, app, events, measure):
+        """Render oneboxes into an event description."""
+        queries = set()
+        for event in events:
+            text = event_text(event)
+            html = measure(
+                'make_oembedplus [%s]' % event.name,
+                make_oembedplus, text, get_oembed_providers(app))
+            assert 'onebox' in html
+            queries.add(measure.queries)
+        # Linked projects are loaded together
+        assert len(queries) == 1
+
+    def test_project_search(self, events, testapp, measure):
+        """Run a full text search over all projects."""
+        for event in events:
+            res = measure(
+                'project_search_json [%s]' % event.name,
+                testapp.get, '/api/project/search.json',
+                {'q': event.name, 'limit': 1000})
+            assert len(res.json['projects']) > 0
+
+    def test_gen_csv(self, events, measure):
+        """Export the project list of an event as CSV."""
+        for event in events:
+            projects = get_project_list(event.id, 'http://localhost/')
+            csv = measure(
+                'gen_csv [%s]' % event.name, gen_csv, projects)
+            assert event.name in csv
@@ -10,7 +10,10 @@ from ..utils import sanitize_input
 from ..extensions import db, cache
 from ..decorators import admin_required
 from ..aggregation import GetProjectData, SyncProjectData
-from ..user.models import Role, User, Event, Project, Category, Resource
+from ..user.models import (
+    Role, User, Event, Project, Category, Resource,
+    counts_by_event, counts_by_category,
+)
 from .forms import (
     RoleForm,
     UserForm, UserProfileForm,
@@ -32,7 +35,7 @@ blueprint = Blueprint('admin', __name__, url_prefix='/admin')
 @login_required
 @admin_required
 def index():
-    event = Event.query.filter_by(is_current=True).first()
+    event = Event.current()
     stats = [
         {
             'value': Event.query.count(),
@@ -266,6 +269,7 @@ def user_reactivate(user_id):
 @admin_required
 def events():
     events = Event.query.order_by(Event.starts_at.desc()).all()
+    counts_by_event(events)
     return render_template('admin/events.html', events=events, active='events')
 
 
@@ -487,6 +491,7 @@ def project_autodata(project_id):
 @admin_required
 def categories():
     categories = Category.query.order_by(Category.event_id.desc()).all()
+    counts_by_category(categories)
     return render_template('admin/categories.html', categories=categories,
                            active='categories')
 
@@ -567,6 +572,7 @@ def category_delete(category_id):
 def presets():
     roles = Role.query.all()
     categories = Category.query.order_by(Category.event_id.desc()).all()
+    counts_by_category(categories)
     return render_template('admin/presets.html', categories=categories,
                            roles=roles, active='roles')
 
@@ -4,6 +4,9 @@
 from dribdat.user.models import Activity, User, Project
 from dribdat.user import isUserActive
 from dribdat.database import db
+from dribdat.metrics import metrics
+from dribdat.versioning import compact_on_growth
+from sqlalchemy.orm import selectinload
 from dribdat.apifetch import (
     FetchGitlabProject,
     FetchGithubProject,
@@ -12,6 +15,7 @@ from dribdat.apifetch import (
     FetchDataProject,
     FetchWebProject,
 )
+import hashlib
 import json
 import re
 
@@ -84,8 +88,23 @@ def AddProjectData(project):
     return project
 
 
+# Project fields which may be changed by a sync
+SYNC_FIELDS = (
+    'autotext', 'summary', 'webpage_url', 'contact_url',
+    'source_url', 'download_url', 'image_url',
+)
+
+
+def SyncContentHash(project):
+    """Fingerprint the synced fields of a project."""
+    content = '\0'.join(getattr(project, f) or '' for f in SYNC_FIELDS)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+@metrics.timed('dribdat_sync_duration_seconds')
 def SyncProjectData(project, data):
-    """Sync remote project data."""
+    """Sync remote project data, return True if the project changed."""
+    before = SyncContentHash(project)
     # Project name should *not* be updated
     # Always update "autotext" field
     if 'description' in data and data['description']:
@@ -109,12 +128,17 @@ def SyncProjectData(project, data):
     if 'image_url' in data and data['image_url'] and \
        (not project.image_url):
         project.image_url = data['image_url'][:2048]
-    project.update()
-    db.session.add(project)
-    db.session.commit()
+    # Unchanged content is not saved, so no new version is recorded
+    changed = SyncContentHash(project) != before
+    if changed:
+        project.update()
+        db.session.add(project)
+        db.session.commit()
+        compact_on_growth(project)
     # Additional logs, if available
     if 'commits' in data:
         SyncCommitData(project, data['commits'])
+    return changed
 
 
 # The above, in one step
@@ -152,16 +176,16 @@ def ProjectsByProgress(progress=None, event=None):
 
 def GetEventUsers(event):
     """Fetch all users that have a project in this event."""
-    if not event.projects:
-        return None
-    users = []
-    userlist = []
-    for p in event.projects:
-        for u in p.get_team():
-            if u.id not in userlist:
-                userlist.append(u.id)
-                users.append(u)
-    return sorted(users, key=lambda x: x.username)
+    return User.query.join(
+        Activity, Activity.user_id == User.id
+    ).join(
+        Project, Activity.project_id == Project.id
+    ).filter(
+        Project.event_id == event.id,
+        Activity.name == 'star'
+    ).options(
+        selectinload(User.roles)
+    ).distinct().order_by(User.username).all()
 
 
 def ProjectActivity(project, of_type, user, action=None, comments=None):
@@ -170,7 +194,7 @@ def ProjectActivity(project, of_type, user, action=None, comments=None):
         name=of_type,
         project_id=project.id,
         project_progress=project.progress,
-        project_version=project.versions.count(),
+        project_version=project.version_count,
         action=action
     )
     activity.user_id = user.id
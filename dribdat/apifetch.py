@@ -3,23 +3,21 @@
 
 import re
 import requests
-import bleach
 import logging
 from flask import url_for
-from pyquery import PyQuery as pq  # noqa: N813
 from base64 import b64decode
 from flask_misaka import markdown
-from bleach.sanitizer import ALLOWED_TAGS, ALLOWED_ATTRIBUTES
 from urllib.parse import quote_plus
 from .apievents import (
     fetch_commits_github, 
     fetch_commits_gitlab,
     fetch_commits_gitea,
 )
-from future.standard_library import install_aliases
-install_aliases()
+from .metrics import metrics
 
 
+@metrics.timed('dribdat_fetch_duration_seconds', {'provider': 'gitea'},
+               errors='dribdat_fetch_errors_total')
 def FetchGiteaProject(project_url):
     """Download data from Codeberg, a large Gitea site."""
     # Docs: https://codeberg.org/api/swagger
@@ -61,6 +59,8 @@ def FetchGiteaProject(project_url):
     }
 
 
+@metrics.timed('dribdat_fetch_duration_seconds', {'provider': 'gitlab'},
+               errors='dribdat_fetch_errors_total')
 def FetchGitlabProject(project_url):
     """Download data from GitLab."""
     WEB_BASE = "https://gitlab.com/%s"
@@ -89,6 +89,8 @@ def FetchGitlabProject(project_url):
     }
 
 
+@metrics.timed('dribdat_fetch_duration_seconds', {'provider': 'gitlab_avatar'},
+               errors='dribdat_fetch_errors_total')
 def FetchGitlabAvatar(email):
     """Download a user avatar from GitLab."""
     apiurl = "https://gitlab.com/api/v4/avatar?email=%s&size=80"
@@ -101,6 +103,8 @@ def FetchGitlabAvatar(email):
     return json['avatar_url']
 
 
+@metrics.timed('dribdat_fetch_duration_seconds', {'provider': 'github'},
+               errors='dribdat_fetch_errors_total')
 def FetchGithubProject(project_url):
     """Download data from GitHub."""
     API_BASE = "https://api.github.com/repos/%s"
@@ -148,6 +152,8 @@ def FetchGithubProject(project_url):
     }
 
 
+@metrics.timed('dribdat_fetch_duration_seconds', {'provider': 'bitbucket'},
+               errors='dribdat_fetch_errors_total')
 def FetchBitbucketProject(project_url):
     """Download data from Bitbucket."""
     WEB_BASE = "https://bitbucket.org/%s"
@@ -190,6 +196,8 @@ def FetchBitbucketProject(project_url):
     }
 
 
+@metrics.timed('dribdat_fetch_duration_seconds', {'provider': 'datapackage'},
+               errors='dribdat_fetch_errors_total')
 def FetchDataProject(project_url):
     """Try to load a Data Package formatted JSON file."""
     # TODO: use frictionlessdata library!
@@ -226,22 +234,41 @@ def FetchDataProject(project_url):
 
 
 # Basis: https://github.com/mozilla/bleach/blob/master/bleach/sanitizer.py#L16
-ALLOWED_HTML_TAGS = ALLOWED_TAGS + [
+ALLOWED_HTML_TAGS = [
     'img', 'font', 'center', 'sub', 'sup', 'pre',
     'h1', 'h2', 'h3', 'h4', 'h5',
     'p', 'u', 'b', 'em', 'i',
 ]
-ALLOWED_HTML_ATTR = ALLOWED_ATTRIBUTES
-ALLOWED_HTML_ATTR['h1'] = ['id']
-ALLOWED_HTML_ATTR['h2'] = ['id']
-ALLOWED_HTML_ATTR['h3'] = ['id']
-ALLOWED_HTML_ATTR['h4'] = ['id']
-ALLOWED_HTML_ATTR['h5'] = ['id']
-ALLOWED_HTML_ATTR['a'] = ['href', 'title', 'class', 'name']
-ALLOWED_HTML_ATTR['img'] = ['src', 'width', 'height', 'alt', 'class']
-ALLOWED_HTML_ATTR['font'] = ['color']
+ALLOWED_HTML_ATTR = {
+    'h1': ['id'],
+    'h2': ['id'],
+    'h3': ['id'],
+    'h4': ['id'],
+    'h5': ['id'],
+    'a': ['href', 'title', 'class', 'name'],
+    'img': ['src', 'width', 'height', 'alt', 'class'],
+    'font': ['color'],
+}
 
 
+def pq(*args, **kwargs):
+    """Parse a document with PyQuery, which is only imported when needed."""
+    from pyquery import PyQuery
+    return PyQuery(*args, **kwargs)
+
+
+def clean_html(html):
+    """Strip the tags and attributes which are not allowed from HTML."""
+    import bleach
+    from bleach.sanitizer import ALLOWED_TAGS, ALLOWED_ATTRIBUTES
+    return bleach.clean(
+        html, strip=True,
+        tags=list(ALLOWED_TAGS) + ALLOWED_HTML_TAGS,
+        attributes=dict(ALLOWED_ATTRIBUTES, **ALLOWED_HTML_ATTR))
+
+
+@metrics.timed('dribdat_fetch_duration_seconds', {'provider': 'web'},
+               errors='dribdat_fetch_errors_total')
 def FetchWebProject(project_url):
     """Parse a remote Document, wiki or website URL."""
     try:
@@ -277,9 +304,7 @@ def FetchWebGoogleDoc(text, url):
     content = doc("div#contents")
     if len(content) < 1:
         return {}
-    html_content = bleach.clean(content.html().strip(), strip=True,
-                                tags=ALLOWED_HTML_TAGS,
-                                attributes=ALLOWED_HTML_ATTR)
+    html_content = clean_html(content.html().strip())
     obj = {}
     # {
     #     'type': 'Google', ...
@@ -326,9 +351,7 @@ def FetchWebDokuWiki(text, url):
     content = doc("div.dw-content")
     if len(content) < 1:
         return {}
-    html_content = bleach.clean(content.html().strip(), strip=True,
-                                tags=ALLOWED_HTML_TAGS,
-                                attributes=ALLOWED_HTML_ATTR)
+    html_content = clean_html(content.html().strip())
     obj = {}
     obj['type'] = 'DokuWiki'
     obj['name'] = ptitle.text().replace('project:', '')
@@ -386,9 +409,7 @@ def FetchWebInstructables(text, url):
                 p = pq(elem).html()
                 if p is None:
                     continue
-                p = bleach.clean(p.strip(), strip=True,
-                                 tags=ALLOWED_HTML_TAGS,
-                                 attributes=ALLOWED_HTML_ATTR)
+                p = clean_html(p.strip())
                 html_content += '<%s>%s</%s>' % (elem.tag, p, elem.tag)
     obj = {}
     obj['type'] = 'Instructables'
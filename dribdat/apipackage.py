@@ -4,7 +4,6 @@
 import logging
 import requests
 from datetime import datetime as dt
-from frictionless import Package, Resource
 from .user.models import Event, Project, Activity, Category, User, Role
 from .utils import format_date
 from .apiutils import (
@@ -17,6 +16,7 @@ from .apiutils import (
 
 def PackageEvent(event, author=None, host_url='', full_contents=False):
     """ Creates a Data Package from the data of an event """
+    from frictionless import Package, Resource
 
     # Define the author, if available
     contributors = []
@@ -4,6 +4,8 @@
 
 from .aggregation import GetEventUsers
 from dribdat.user.models import Event, Project, Category, Activity
+from dribdat.database import db
+from sqlalchemy.orm import undefer_group
 import io
 import csv
 import json
@@ -13,14 +15,53 @@ from dribdat.utils import format_date
 from sys import version_info
 PY3 = version_info[0] == 3
 
+# Columns which may be requested with the 'fields' parameter
+PROJECT_FIELDS = (
+    'id', 'name', 'summary', 'score', 'progress', 'hashtag',
+    'image_url', 'source_url', 'webpage_url', 'autotext_url',
+    'download_url', 'contact_url', 'logo_color', 'logo_icon',
+    'event_id', 'category_id', 'user_id', 'created_at', 'updated_at',
+    'longtext', 'autotext',
+)
+ACTIVITY_FIELDS = (
+    'id', 'name', 'action', 'content', 'ref_url', 'timestamp',
+    'user_id', 'project_id', 'project_score', 'project_progress',
+)
+
+
+def parse_fields(fields, allowed):
+    """Parse a comma-separated list of fields, keeping the allowed ones."""
+    if not fields:
+        return None
+    selected = []
+    for f in fields.split(','):
+        f = f.strip()
+        if f in allowed and f not in selected:
+            selected.append(f)
+    return selected or None
+
+
+def select_fields(query, model, fields):
+    """Fetch only some columns of a query, as a list of dicts."""
+    rows = query.with_entities(*[getattr(model, f) for f in fields])
+    results = []
+    for row in rows:
+        d = row._asdict()
+        for k, v in d.items():
+            if isinstance(v, datetime):
+                d[k] = format_date(v, '%Y-%m-%dT%H:%M')
+        results.append(d)
+    return results
+
 
 def get_projects_by_event(event_id):
     """Get all the visible projects that belong to an event."""
     return Project.query.filter_by(event_id=event_id, is_hidden=False)
 
 
-def get_event_activities(event_id=None, limit=50, q=None, action=None):
-    """Fetch activities of a given event."""
+def get_event_activities(event_id=None, limit=50, q=None, action=None,
+                         fields=None):
+    """Fetch activities of a given event, optionally only some fields."""
     if event_id is not None:
         event = Event.query.filter_by(id=event_id).first_or_404()
         query = Activity.query \
@@ -33,8 +74,10 @@ def get_event_activities(event_id=None, limit=50, q=None, action=None):
         query = query.filter(Activity.content.like(q))
     if action is not None:
         query = query.filter(Activity.action == action)
-    results = query.order_by(Activity.id.desc()).limit(limit).all()
-    return [a.data for a in results]
+    query = query.order_by(Activity.id.desc()).limit(limit)
+    if fields:
+        return select_fields(query, Activity, fields)
+    return [a.data for a in query.all()]
 
 
 def get_event_categories(event_id=None):
@@ -89,9 +132,18 @@ def get_project_summaries(projects, host_url, is_moar=False):
     return summaries
 
 
-def get_project_list(event_id, host_url='', full_data=False):
-    """Collect all projects and challenges for an event."""
+def get_project_list(event_id, host_url='', full_data=False, fields=None):
+    """Collect all projects and challenges for an event.
+
+    With a list of fields, only those columns are loaded and returned.
+    """
     projects = get_projects_by_event(event_id)
+    if fields:
+        projects = projects.order_by(
+            db.func.coalesce(Project.score, 0).desc(), Project.id)
+        return select_fields(projects, Project, fields)
+    if full_data:
+        projects = projects.options(undefer_group('text'))
     return get_project_summaries(projects, host_url, full_data)
 
 
@@ -1,13 +1,14 @@
 # -*- coding: utf-8 -*-
 """The app module, containing the app factory function."""
 
+import os
 from flask import Flask, render_template
+from jinja2 import FileSystemBytecodeCache
 from flask_cors import CORS
 from flask_misaka import Misaka
 from flask_mailman import Mail
 from flask_talisman import Talisman
 from werkzeug.middleware.proxy_fix import ProxyFix
-from micawber.providers import bootstrap_basic
 from whitenoise import WhiteNoise
 from pytz import timezone
 from urllib.parse import quote_plus
@@ -23,7 +24,11 @@ from dribdat.extensions import (
 )
 from dribdat.settings import ProdConfig  # noqa: I005
 from dribdat.utils import timesince
-from dribdat.onebox import make_oembedplus
+from dribdat.onebox import (
+    make_oembedplus, get_oembed_providers, reset_embeds,
+)
+from dribdat.metrics import init_metrics, metrics
+from dribdat.mailer import start_worker
 
 
 def init_app(config_object=ProdConfig):
@@ -55,6 +60,7 @@ def init_app(config_object=ProdConfig):
     register_oauthhandlers(app)
     register_errorhandlers(app)
     register_filters(app)
+    register_templates(app)
     register_loggers(app)
     register_shellcontext(app)
     register_commands(app)
@@ -71,6 +77,8 @@ def register_extensions(app):
     migrate.init_app(app, db)
     init_mailman(app)
     init_talisman(app)
+    if app.config['SERVER_METRICS']:
+        init_metrics(app)
     return None
 
 
@@ -82,6 +90,8 @@ def init_mailman(app):
         else:
             mail = Mail()
             mail.init_app(app)
+            # Deliver what is left in the queue from before a restart
+            start_worker(app)
 
 
 def init_talisman(app):
@@ -147,13 +157,13 @@ def register_filters(app):
     Misaka(app, autolink=True, fenced_code=True,
            strikethrough=True, tables=True)
 
-    # Registration of handlers for micawber
-    app.oembed_providers = bootstrap_basic()
+    # Registration of handlers for micawber, see get_oembed_providers
+    app.oembed_providers = None
 
     @app.template_filter()
     def onebox(value):
         return make_oembedplus(
-            value, app.oembed_providers, maxwidth=600, maxheight=400
+            value, get_oembed_providers(app), maxwidth=600, maxheight=400
         )
 
     # Timezone helper
@@ -180,9 +190,47 @@ def register_filters(app):
         return value.strftime(format)
 
 
+def register_templates(app):
+    """Keep compiled templates on disk, if a folder is configured."""
+    cache_dir = app.config['JINJA_CACHE_DIR']
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+
+
+def precompile_templates(app):
+    """Compile all templates, return how many there are."""
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
 def register_loggers(app):
     """Initialize and configure logging."""
     import logging
     stream_handler = logging.StreamHandler()
     app.logger.addHandler(stream_handler)
     app.logger.setLevel(logging.INFO)
+
+
+def warm_up(app):
+    """Load what the forked workers of a preloaded app can share."""
+    # Compile all templates and set up the embed providers once
+    precompile_templates(app)
+    get_oembed_providers(app)
+    # Workers should not inherit open database connections
+    with app.app_context():
+        db.engine.dispose()
+
+
+def init_worker(app):
+    """Reset the process-local state of a forked worker."""
+    with app.app_context():
+        # Discard the connections of the parent process
+        db.engine.dispose()
+    reset_embeds()
+    metrics.reset()
+    # The mail thread of the parent process is not forked
+    if 'mailman' in app.extensions:
+        start_worker(app)
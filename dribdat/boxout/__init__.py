@@ -1,2 +1,23 @@
 # -*- coding: utf-8 -*-
 """Boxout modules for parsing resource types."""
+
+# Shared by all boxouts, see register_template
+renderer = None
+sources = {}
+templates = {}
+
+
+def register_template(name, template):
+    """Add a Mustache template, which is parsed once at its first render."""
+    sources[name] = template
+
+
+def render_box(name, *context, **kwargs):
+    """Render a registered template."""
+    global renderer
+    import pystache
+    if renderer is None:
+        renderer = pystache.Renderer()
+    if name not in templates:
+        templates[name] = pystache.parse(sources[name])
+    return renderer.render(templates[name], *context, **kwargs)
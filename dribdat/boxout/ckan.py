@@ -1,7 +1,7 @@
 """Boxout module for CKAN datasets."""
 
-import pystache
 import random
+from . import register_template, render_box
 
 TEMPLATE_PACKAGE = r"""
 <div class="boxout ckan card mb-4">
@@ -13,6 +13,7 @@ TEMPLATE_PACKAGE = r"""
   </script>
 </div>
 """
+register_template('dataset', TEMPLATE_PACKAGE)
 
 
 def ini_dataset():
@@ -31,5 +32,5 @@ def chk_dataset(line):
 def box_dataset(url):
     """Create a OneBox for local projects."""
     rnd = random.Random().randrange(0, 9999)
-    box = pystache.render(TEMPLATE_PACKAGE, {'url': url, 'rnd': rnd})
+    box = render_box('dataset', {'url': url, 'rnd': rnd})
     return box
@@ -2,8 +2,7 @@
 
 import re
 import logging
-import pystache
-from frictionless import Package
+from . import register_template, render_box
 
 TEMPLATE_PACKAGE = r"""
 <div class="boxout datapackage card mb-4" style="max-width:23em">
@@ -41,6 +40,7 @@ TEMPLATE_PACKAGE = r"""
   </div>
 </div>
 """
+register_template('datapackage', TEMPLATE_PACKAGE)
 
 dpkg_url_re = re.compile(r'.*(http?s:\/\/.+datapackage\.json)\)*')
 
@@ -58,17 +58,19 @@ def box_datapackage(line, cache=None):
     if not m:
         return None
     url = m.group(1)
-    if cache and cache.has(url):
-        return cache.get(url)
+    if cache:
+        box = cache.get(url)
+        if box is not None:
+            return box
+    from frictionless import Package
     try:
         logging.info("Fetching Data Package: <%s>" % url)
         package = Package(url)
     except Exception:  # noqa: B902
         logging.warn("Data Package not parsed: <%s>" % url)
         return None
-    box = pystache.render(TEMPLATE_PACKAGE, package)
+    box = render_box('datapackage', package)
     if cache:
         cache.set(url, box)
-    if cache and cache.has(url):
         logging.debug("Cached Data Package: <%s>" % url)
     return box
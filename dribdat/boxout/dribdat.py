@@ -1,6 +1,6 @@
 """Boxout module for Dribdat projects."""
 
-import pystache
+from . import register_template, render_box
 
 TEMPLATE_PROJECT = r"""
 <div class="onebox honeycomb">
@@ -19,18 +19,54 @@ TEMPLATE_PROJECT = r"""
     <p>{{summary}}</p>
 </div>
 """
+register_template('project', TEMPLATE_PROJECT)
 
 
-def box_project(url):
-    """Create a OneBox for local projects."""
+def project_id_from_url(url):
+    """Extract the project id from a project link."""
     project_id = url.split('/')[-1]
-    if not project_id:
+    if not project_id.isdigit():
         return None
+    return int(project_id)
+
+
+def box_project_data(project_ids):
+    """Fetch the fields shown in project boxes, in one query."""
+    project_ids = set(pid for pid in project_ids if pid is not None)
+    if not project_ids:
+        return {}
     from ..user.models import Project
-    project = Project.query.filter_by(id=int(project_id)).first()
-    if not project:
+    from ..user.constants import getProjectPhase, PR_CHALLENGE
+    rows = Project.query.with_entities(
+        Project.id, Project.name, Project.summary,
+        Project.image_url, Project.progress,
+    ).filter(Project.id.in_(project_ids))
+    boxes = {}
+    for row in rows:
+        boxes[row.id] = {
+            'name': row.name,
+            'summary': row.summary or '',
+            'image_url': row.image_url or '',
+            'progress': row.progress,
+            'phase': getProjectPhase(row),
+            'is_challenge': row.progress is not None
+            and row.progress <= PR_CHALLENGE,
+        }
+    return boxes
+
+
+def box_project(url, boxes=None):
+    """Create a OneBox for local projects.
+
+    Pass the result of box_project_data to avoid a query per project.
+    """
+    project_id = project_id_from_url(url)
+    if project_id is None:
+        return None
+    if boxes is None:
+        boxes = box_project_data([project_id])
+    if project_id not in boxes:
         return None
-    pd = project.data
-    # project.url returns a relative path
+    pd = dict(boxes[project_id])
     pd['link'] = url
-    return pystache.render(TEMPLATE_PROJECT, pd)
+    return render_box('project', pd)
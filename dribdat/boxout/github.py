@@ -1,6 +1,6 @@
 """Boxout module for GitHub projects."""
 
-import pystache
+from . import register_template, render_box
 
 TEMPLATE_GITHUB = r"""
 <div class="widget widget-github">
@@ -13,6 +13,7 @@ TEMPLATE_GITHUB = r"""
 <script src="//cdn.jsdelivr.net/github-cards/latest/widget.js"></script>
 </div>
 """
+register_template('github', TEMPLATE_GITHUB)
 
 
 def box_repo(url='dribdat/dribdat'):
@@ -23,5 +24,5 @@ def box_repo(url='dribdat/dribdat'):
     has_issues = project_repo.endswith('/issues')
     project_repo = project_repo.replace('/issues', '')
     project_repo = project_repo.strip()
-    return pystache.render(TEMPLATE_GITHUB, {
+    return render_box('github', {
         'repo': project_repo, 'issues': has_issues})
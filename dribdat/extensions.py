@@ -2,12 +2,49 @@
 """Extensions module. Each extension is initialized in the app factory located in app.py."""
 from flask_hashing import Hashing
 from flask_caching import Cache
+from flask_caching.backends import SimpleCache, NullCache
 from flask_login import LoginManager
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
+from dribdat.metrics import metrics
+from uuid import uuid4
+
+
+class MeteredCache(Cache):
+    """Cache which counts its hits and misses."""
+
+    def get(self, *args, **kwargs):
+        """Look up a value, counting the result."""
+        value = super().get(*args, **kwargs)
+        metrics.inc('dribdat_cache_requests_total',
+                    {'result': 'miss' if value is None else 'hit'})
+        return value
+
+    def version(self, name):
+        """Return the current stamp of a group of cached values.
+
+        Include the stamp in the cache keys of the group, so that
+        calling bump() makes all of them stale at once.
+        """
+        stamp = super().get('version-' + name)
+        if stamp is None:
+            stamp = self.bump(name)
+        return stamp
+
+    @property
+    def is_shared(self):
+        """Return whether all worker processes see the same values."""
+        return not isinstance(self.cache, (SimpleCache, NullCache))
+
+    def bump(self, name):
+        """Start a new version of a group of cached values."""
+        stamp = uuid4().hex[:12]
+        self.set('version-' + name, stamp, timeout=0)
+        return stamp
+
 
 hashing = Hashing()
 login_manager = LoginManager()
 db = SQLAlchemy()
 migrate = Migrate()
-cache = Cache()
+cache = MeteredCache()
@@ -1,13 +1,223 @@
 # -*- coding: utf-8 -*-
-"""Helper for sending mail."""
-from flask import url_for
+"""Helper for sending mail.
+
+Outgoing messages are written to a spool directory, and delivered in
+batches by a background thread, so requests never wait on the mail server.
+Each message is a JSON file, moved between the subfolders of the spool
+as its delivery status changes, and deleted once it is sent.
+"""
+import os
+import json
+import time
+import uuid
+import threading
+from flask import url_for, current_app
 from flask_mailman import EmailMessage
 from dribdat.utils import random_password  # noqa: I005
+from dribdat.metrics import metrics
+
+# Subfolders of the spool, one per delivery status
+SPOOL_STATUS = ('queued', 'sending', 'failed')
+
+# Messages left in 'sending' for longer (e.g. after a crash) are retried
+SENDING_TIMEOUT = 600
+
+_worker = None
+_worker_lock = threading.Lock()
+_wakeup = threading.Event()
+
+
+def spool_path(app, status):
+    """Return the spool folder for a delivery status."""
+    path = os.path.join(app.config['MAIL_SPOOL'], status)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def write_item(folder, name, item):
+    """Atomically write a spooled message."""
+    filename = os.path.join(folder, name)
+    with open(filename + '.tmp', 'w') as f:
+        json.dump(item, f)
+    os.replace(filename + '.tmp', filename)
+
+
+def read_item(folder, name):
+    """Read a spooled message, or None if it is gone or unreadable."""
+    try:
+        with open(os.path.join(folder, name)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def queue_mail(app, msg):
+    """Add a message to the delivery queue, return its spool name."""
+    app = getattr(app, '_get_current_object', lambda: app)()
+    item = {
+        'subject': msg.subject,
+        'body': msg.body,
+        'from_email': msg.from_email,
+        'to': list(msg.to),
+        'status': 'queued',
+        'attempts': 0,
+        'error': None,
+        'queued_at': time.time(),
+        'next_attempt': 0,
+    }
+    name = '%d-%s.json' % (time.time() * 1000, uuid.uuid4().hex[:8])
+    write_item(spool_path(app, 'queued'), name, item)
+    start_worker(app)
+    _wakeup.set()
+    return name
+
+
+def requeue_stale(app):
+    """Return messages stuck in 'sending' to the queue."""
+    sending = spool_path(app, 'sending')
+    queued = spool_path(app, 'queued')
+    for name in os.listdir(sending):
+        filename = os.path.join(sending, name)
+        try:
+            if time.time() - os.path.getmtime(filename) > SENDING_TIMEOUT:
+                os.replace(filename, os.path.join(queued, name))
+        except OSError:
+            continue
 
 
-async def send_async_email(app, msg):
+def claim_batch(app):
+    """Move due messages from the queue to 'sending'."""
+    queued = spool_path(app, 'queued')
+    sending = spool_path(app, 'sending')
+    now = time.time()
+    batch = []
+    for name in sorted(os.listdir(queued)):
+        if len(batch) >= app.config['MAIL_BATCH_SIZE']:
+            break
+        if not name.endswith('.json'):
+            continue
+        item = read_item(queued, name)
+        if item is None or item['next_attempt'] > now:
+            continue
+        try:
+            os.replace(os.path.join(queued, name),
+                       os.path.join(sending, name))
+        except OSError:
+            continue  # claimed by another worker
+        # Mark the time of the claim, see requeue_stale
+        os.utime(os.path.join(sending, name))
+        batch.append((name, item))
+    return batch
+
+
+def finish_item(app, name, item, error=None):
+    """Record the outcome of a delivery attempt."""
+    item['attempts'] += 1
+    if error is None:
+        item['status'] = 'sent'
+    else:
+        item['error'] = str(error)
+        if item['attempts'] >= app.config['MAIL_MAX_RETRIES']:
+            item['status'] = 'failed'
+        else:
+            # Exponential backoff between attempts
+            item['status'] = 'queued'
+            item['next_attempt'] = time.time() + \
+                app.config['MAIL_QUEUE_INTERVAL'] * 2 ** item['attempts']
+        app.logger.warning('Mail delivery failed (%d): %s' % (
+            item['attempts'], item['error']))
+    metrics.inc('dribdat_mail_deliveries_total', {
+        'status': 'retry' if item['status'] == 'queued' else item['status']})
+    # Sent messages are not kept, as they may contain activation links
+    if item['status'] != 'sent':
+        write_item(spool_path(app, item['status']), name, item)
+    try:
+        os.remove(os.path.join(spool_path(app, 'sending'), name))
+    except OSError:
+        pass
+
+
+def deliver_queued(app):
+    """Send a batch of queued messages, return how many were sent."""
+    requeue_stale(app)
+    batch = claim_batch(app)
+    if not batch:
+        return 0
+    sent = 0
     with app.app_context():
-        msg.send()
+        # One connection is shared by the whole batch
+        connection = current_app.extensions['mailman'].get_connection()
+        try:
+            connection.open()
+        except Exception as ex:  # noqa: B902
+            for name, item in batch:
+                finish_item(app, name, item, ex)
+            return 0
+        try:
+            for name, item in batch:
+                msg = EmailMessage(
+                    subject=item['subject'],
+                    body=item['body'],
+                    from_email=item['from_email'],
+                    to=item['to'],
+                    connection=connection)
+                try:
+                    msg.send()
+                except Exception as ex:  # noqa: B902
+                    finish_item(app, name, item, ex)
+                else:
+                    finish_item(app, name, item)
+                    sent = sent + 1
+        finally:
+            connection.close()
+    return sent
+
+
+def queue_status(app):
+    """Count the messages in each folder of the spool."""
+    return {
+        status: len([
+            f for f in os.listdir(spool_path(app, status))
+            if f.endswith('.json')])
+        for status in SPOOL_STATUS
+    }
+
+
+def run_worker(app):
+    """Deliver mail until the process exits."""
+    while True:
+        try:
+            while deliver_queued(app):
+                pass
+        except Exception:  # noqa: B902
+            app.logger.exception('Mail queue worker error')
+        _wakeup.wait(app.config['MAIL_QUEUE_INTERVAL'])
+        _wakeup.clear()
+
+
+def start_worker(app):
+    """Start the background delivery thread, once per process."""
+    global _worker
+    if not app.config['MAIL_WORKER']:
+        return
+    with _worker_lock:
+        # Threads do not survive a fork, so this also restarts in workers
+        if _worker is not None and _worker.is_alive():
+            return
+        _worker = threading.Thread(
+            target=run_worker, args=(app,),
+            name='dribdat-mailer', daemon=True)
+        _worker.start()
+
+
+def queue_depth():
+    """Count the messages waiting for delivery."""
+    if not current_app.config['MAIL_SERVER']:
+        return None
+    return queue_status(current_app)['queued']
+
+
+metrics.gauge('dribdat_mail_queue_depth', queue_depth)
 
 
 def user_activation(app, user):
@@ -28,5 +238,5 @@ def user_activation(app, user):
             "Thanks for signing up at %s\n\n" % base_url \
             + "Tap here to activate your account:\n\n%s" % act_url
         msg.to = [user.email]
-        app.logger.info('Sending mail to user %d' % user.id)
-        send_async_email(app, msg)
+        app.logger.info('Queueing mail to user %d' % user.id)
+        queue_mail(app, msg)
@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+"""Operational metrics in the Prometheus text format."""
+
+import os
+import json
+import time
+import atexit
+from functools import wraps
+from threading import Lock
+from flask import Response, g, request
+
+# Upper bounds of the latency histograms, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Least number of seconds between saves to the shared folder
+SAVE_INTERVAL = 1
+
+# Short description of each metric, in the order they are output
+DESCRIPTIONS = {
+    'dribdat_requests_total':
+        ('counter', 'Requests handled per endpoint and status'),
+    'dribdat_request_duration_seconds':
+        ('histogram', 'Request latency per endpoint'),
+    'dribdat_db_pool_size':
+        ('gauge', 'Connections kept in the database pool'),
+    'dribdat_db_pool_checked_out':
+        ('gauge', 'Database connections in use'),
+    'dribdat_db_pool_overflow':
+        ('gauge', 'Database connections beyond the pool size'),
+    'dribdat_cache_requests_total':
+        ('counter', 'Cache lookups by result (hit or miss)'),
+    'dribdat_fetch_duration_seconds':
+        ('histogram', 'Latency of remote data fetches per provider'),
+    'dribdat_fetch_errors_total':
+        ('counter', 'Failed or empty remote data fetches per provider'),
+    'dribdat_sync_duration_seconds':
+        ('histogram', 'Duration of project data syncs'),
+    'dribdat_mail_queue_depth':
+        ('gauge', 'Messages waiting in the mail queue'),
+    'dribdat_mail_deliveries_total':
+        ('counter', 'Mail delivery attempts by outcome'),
+}
+
+
+def format_labels(labels, extra=None):
+    """Render a label set as {key="value",..}."""
+    items = list(labels) + list(extra or [])
+    if not items:
+        return ''
+    return '{%s}' % ','.join(
+        '%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+        for k, v in items)
+
+
+class Registry(object):
+    """Process-local store of counters, histograms and gauges.
+
+    With several worker processes, each one saves its counters and
+    histograms into a shared folder, and they are added up for output.
+    Gauges always describe the process which answers.
+    """
+
+    def __init__(self):
+        """Start with no values."""
+        self.gauges = {}
+        self.folder = None
+        self.reset()
+
+    def reset(self):
+        """Clear the values, for example in a forked process."""
+        self.lock = Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.saved_at = 0
+
+    def inc(self, name, labels=None, value=1):
+        """Increment a counter."""
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, labels=None):
+        """Add a value to a histogram."""
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self.lock:
+            if key not in self.histograms:
+                # One slot per bucket, then the sum and count
+                self.histograms[key] = [0] * len(BUCKETS) + [0.0, 0]
+            hist = self.histograms[key]
+            for ix, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    hist[ix] += 1
+            hist[-2] += value
+            hist[-1] += 1
+
+    def gauge(self, name, callback):
+        """Register a function which returns the current gauge value."""
+        self.gauges[name] = callback
+
+    def share(self, folder):
+        """Save the values into a folder shared with other processes."""
+        self.folder = folder or None
+        if self.folder:
+            os.makedirs(self.folder, exist_ok=True)
+
+    def save(self, force=False):
+        """Write the values of this process to the shared folder.
+
+        Unless forced, this is skipped if the last save was less than
+        SAVE_INTERVAL seconds ago.
+        """
+        if not self.folder:
+            return
+        now = time.monotonic()
+        if not force and now - self.saved_at < SAVE_INTERVAL:
+            return
+        self.saved_at = now
+        with self.lock:
+            data = {
+                'counters': [
+                    [name, labels, value]
+                    for (name, labels), value in self.counters.items()],
+                'histograms': [
+                    [name, labels, hist]
+                    for (name, labels), hist in self.histograms.items()],
+            }
+        path = os.path.join(self.folder, 'metrics-%d.json' % os.getpid())
+        with open(path + '.tmp', 'w') as f:
+            json.dump(data, f)
+        os.replace(path + '.tmp', path)
+
+    def collect(self):
+        """Return the counters and histograms of all processes."""
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {k: list(v) for k, v in self.histograms.items()}
+        if not self.folder:
+            return counters, histograms
+        own = 'metrics-%d.json' % os.getpid()
+        for filename in os.listdir(self.folder):
+            if filename == own or not filename.startswith('metrics-') \
+               or not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.folder, filename)) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in data['counters']:
+                key = (name, tuple(tuple(label) for label in labels))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, hist in data['histograms']:
+                key = (name, tuple(tuple(label) for label in labels))
+                if key in histograms:
+                    hist = [a + b for a, b in zip(histograms[key], hist)]
+                histograms[key] = hist
+        return counters, histograms
+
+    def timed(self, name, labels=None, errors=None):
+        """Decorate a function to observe its duration.
+
+        If errors is the name of a counter, it is incremented when the
+        function raises an exception or returns an empty result.
+        """
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    result = func(*args, **kwargs)
+                except Exception:  # noqa: B902
+                    if errors:
+                        self.inc(errors, labels)
+                    raise
+                finally:
+                    self.observe(name, time.perf_counter() - started, labels)
+                if errors and not result:
+                    self.inc(errors, labels)
+                return result
+            return wrapper
+        return decorator
+
+    def render(self):
+        """Output all metrics in the Prometheus text format."""
+        lines = []
+        counters, histograms = self.collect()
+        gauges = {}
+        for name, callback in self.gauges.items():
+            value = callback()
+            if value is not None:
+                gauges[name] = value
+        for name, (kind, text) in DESCRIPTIONS.items():
+            lines.append('# HELP %s %s' % (name, text))
+            lines.append('# TYPE %s %s' % (name, kind))
+            if name in gauges:
+                lines.append('%s %s' % (name, gauges[name]))
+            for (cname, labels), value in sorted(counters.items()):
+                if cname == name:
+                    lines.append('%s%s %s' % (
+                        name, format_labels(labels), value))
+            for (hname, labels), hist in sorted(histograms.items()):
+                if hname != name:
+                    continue
+                for ix, bound in enumerate(BUCKETS):
+                    lines.append('%s_bucket%s %d' % (
+                        name, format_labels(labels, [('le', bound)]),
+                        hist[ix]))
+                lines.append('%s_bucket%s %d' % (
+                    name, format_labels(labels, [('le', '+Inf')]), hist[-1]))
+                lines.append('%s_sum%s %f' % (
+                    name, format_labels(labels), hist[-2]))
+                lines.append('%s_count%s %d' % (
+                    name, format_labels(labels), hist[-1]))
+        return '\n'.join(lines) + '\n'
+
+
+# Shared by the whole process
+metrics = Registry()
+
+
+def pool_stat(stat):
+    """Create a gauge callback for a database pool statistic."""
+    def callback():
+        from dribdat.extensions import db
+        func = getattr(db.engine.pool, stat, None)
+        # Not all pool classes (e.g. for SQLite) provide statistics
+        return func() if callable(func) else None
+    return callback
+
+
+def init_metrics(app):
+    """Measure requests and publish all metrics on /metrics."""
+    metrics.gauge('dribdat_db_pool_size', pool_stat('size'))
+    metrics.gauge('dribdat_db_pool_checked_out', pool_stat('checkedout'))
+    metrics.gauge('dribdat_db_pool_overflow', pool_stat('overflow'))
+    metrics.share(app.config['METRICS_DIR'])
+    # Keep the requests since the last save
+    atexit.register(metrics.save, force=True)
+
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def stop_timer(response):
+        if 'metrics_started' in g:
+            labels = {'endpoint': request.endpoint or 'none'}
+            metrics.observe(
+                'dribdat_request_duration_seconds',
+                time.perf_counter() - g.metrics_started, labels)
+            labels['status'] = response.status_code
+            metrics.inc('dribdat_requests_total', labels)
+            metrics.save()
+        return response
+
+    def metrics_view():
+        return Response(metrics.render(),
+                        mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
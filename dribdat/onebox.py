@@ -3,14 +3,25 @@
 
 import re
 import logging
-from flask import url_for
-from micawber.parsers import standalone_url_re, full_handler
-from .boxout.dribdat import box_project
+import hashlib
+import datetime as dt
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, wait
+from flask import url_for, current_app
+from .boxout.dribdat import box_project, box_project_data, project_id_from_url
 from .boxout.datapackage import box_datapackage, chk_datapackage
 from .boxout.ckan import box_dataset, chk_dataset, ini_dataset
 from .boxout.github import box_repo
 from dribdat.extensions import cache
 
+# Seconds before a failed embed is attempted again
+FAILED_TTL = 300
+
+# Remote embeds are resolved in the background, never during a render
+_executor = None
+_pending = {}
+_pending_lock = Lock()
+
 
 def format_webembed(url):
     """Create a well-formatted frame for project embeds."""
@@ -34,7 +45,7 @@ def format_webembed(url):
     return '<iframe src="%s"></iframe>' % url
 
 
-def repl_onebox(mat=None, li=[]):
+def repl_onebox(mat=None, li=[], boxes=None):
     """Check for onebox application links."""
     if mat is None:
         li[:] = []
@@ -43,34 +54,47 @@ def repl_onebox(mat=None, li=[]):
         url = mat.group(1).strip()
         if '/project/' in url:
             # Try to parse a project link
-            return box_project(url) or mat.group()
+            return box_project(url, boxes) or mat.group()
     return mat.group()
 
 
+def prefetch_projects(urls):
+    """Load the data of all linked projects at once."""
+    return box_project_data(
+        project_id_from_url(u.strip()) for u in urls if '/project/' in u)
+
+
 def make_onebox(raw_html):
     """Create a onebox container."""
     url = re.escape(url_for('public.home', _external=True))
     regexp = re.compile('<a href="(%s.+?)">(%s.+?)</a>' % (url, url))
-    return re.sub(regexp, repl_onebox, raw_html)
+    boxes = prefetch_projects(
+        m.group(1) for m in regexp.finditer(raw_html))
+    return re.sub(regexp, lambda m: repl_onebox(m, boxes=boxes), raw_html)
 
 
 def make_oembedplus(text, oembed_providers, **params):
     """Check for additional onebox lines."""
+    from micawber.parsers import standalone_url_re
     lines = text.splitlines()
     parsed = []
     has_dataset = False
     # Url to projects
     home_url = re.escape(url_for('public.home', _external=True) + 'project/')
     home_url_re = re.compile('(%s.+)' % home_url)
+    boxes = prefetch_projects(
+        line for line in lines if home_url_re.match(line))
     # Iterate each line (inefficient!)
     for line in lines:
         newline = None
         if home_url_re.match(line):
             # Parse an internal project
-            newline = re.sub(home_url_re, repl_onebox, line)
+            newline = re.sub(
+                home_url_re, lambda m: repl_onebox(m, boxes=boxes), line)
         elif chk_datapackage(line):
             # Try to parse a Data Package link
-            newline = box_datapackage(line, cache)
+            newline = cached_embed(
+                'datapackage', line, box_datapackage, line)
         elif chk_dataset(line):
             # Try to render a CKAN dataset link
             newline = box_dataset(line)
@@ -91,9 +115,26 @@ def make_oembedplus(text, oembed_providers, **params):
     return '\n'.join(parsed)
 
 
+def get_oembed_providers(app):
+    """Return the built-in providers of the app, set up at first use."""
+    if app.oembed_providers is None:
+        from micawber.providers import bootstrap_basic
+        app.oembed_providers = bootstrap_basic()
+    return app.oembed_providers
+
+
 def box_default(line, oembed_providers, **params):
-    """Fetch a built-in provider box."""
+    """Fetch a built-in provider box, if it was already resolved."""
     url = line.strip()
+    if oembed_providers.provider_for_url(url) is None:
+        return None
+    return cached_embed(
+        'oembed', url, fetch_oembed, url, oembed_providers, **params)
+
+
+def fetch_oembed(url, oembed_providers, **params):
+    """Request a built-in provider box from the remote site."""
+    from micawber.parsers import full_handler
     try:
         response = oembed_providers.request(url, **params)
     except Exception:  # noqa: B902
@@ -101,3 +142,90 @@ def box_default(line, oembed_providers, **params):
     else:
         return full_handler(url, response, **params)
     return None
+
+
+def embed_key(kind, url, params):
+    """Compose a cache key for a remote embed."""
+    ref = '%s %s %r' % (kind, url, sorted(params.items()))
+    return 'embed-' + hashlib.md5(ref.encode('utf-8')).hexdigest()
+
+
+def cached_embed(kind, url, resolver, *args, **params):
+    """Return a resolved embed, or None while it is being resolved."""
+    key = embed_key(kind, url, params)
+    html = cache.get(key)
+    if html is None:
+        html = stored_embed(key)
+    if html is not None:
+        # An empty string marks an embed which could not be resolved
+        return html or None
+    app = current_app._get_current_object()
+    with _pending_lock:
+        if key not in _pending:
+            _pending[key] = get_executor().submit(
+                resolve_embed, app, key, url, resolver, *args, **params)
+    return None
+
+
+def embed_ttl(html):
+    """Lifetime of a resolved embed, shorter for failures."""
+    return current_app.config['ONEBOX_TTL'] if html else FAILED_TTL
+
+
+def stored_embed(key):
+    """Load a fresh embed from the database into the cache."""
+    from dribdat.user.models import Embed
+    embed = Embed.query.filter_by(key=key).first()
+    if embed is None:
+        return None
+    expires_in = embed.expires_in(embed_ttl(embed.html))
+    if expires_in <= 0:
+        return None
+    cache.set(key, embed.html or '', timeout=expires_in)
+    return embed.html or ''
+
+
+def resolve_embed(app, key, url, resolver, *args, **params):
+    """Resolve a remote embed into the database and cache."""
+    from dribdat.user.models import Embed
+    try:
+        with app.app_context():
+            html = resolver(*args, **params) or ''
+            embed = Embed.query.filter_by(key=key).first()
+            if embed is None:
+                embed = Embed(key=key)
+            embed.url = url[:2048]
+            embed.html = html
+            embed.fetched_at = dt.datetime.utcnow()
+            embed.save()
+            cache.set(key, html, timeout=embed_ttl(html))
+    except Exception:  # noqa: B902
+        logging.exception("Embed could not be resolved")
+    finally:
+        with _pending_lock:
+            _pending.pop(key, None)
+
+
+def get_executor():
+    """Start the pool of threads resolving embeds."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=current_app.config['ONEBOX_WORKERS'],
+            thread_name_prefix='dribdat-embed')
+    return _executor
+
+
+def reset_embeds():
+    """Forget the embeds scheduled by the parent of a forked process."""
+    global _executor, _pending, _pending_lock
+    _executor = None
+    _pending = {}
+    _pending_lock = Lock()
+
+
+def wait_embeds(timeout=None):
+    """Wait until the scheduled embeds are resolved."""
+    with _pending_lock:
+        futures = list(_pending.values())
+    wait(futures, timeout)
@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
 """API calls for dribdat."""
-import boto3
 from flask import (
     Blueprint, current_app,
     Response, request, redirect,
@@ -22,6 +21,10 @@ from ..apiutils import (
     get_schema_for_user_projects,
     expand_project_urls,
     gen_csv,
+    parse_fields,
+    select_fields,
+    PROJECT_FIELDS,
+    ACTIVITY_FIELDS,
 )
 import tempfile
 import json
@@ -35,7 +38,7 @@ blueprint = Blueprint('api', __name__, url_prefix='/api')
 @blueprint.route('/event/current/info.json')
 def info_current_event_json():
     """Output JSON about the current event."""
-    event = Event.query.filter_by(is_current=True).first() or \
+    event = Event.current() or \
         Event.query.order_by(Event.id.desc()).first_or_404()
     timeuntil = timesince(event.countdown, until=True)
     return jsonify(event=event.data, timeuntil=timeuntil)
@@ -63,13 +66,19 @@ def request_project_list(event_id):
     """Fetch a project list."""
     is_moar = bool(request.args.get('moar', type=bool))
     host_url = request.host_url
-    return get_project_list(event_id, host_url, is_moar)
+    fields = parse_fields(request.args.get('fields'), PROJECT_FIELDS)
+    return get_project_list(event_id, host_url, is_moar, fields)
+
+
+def request_activity_fields():
+    """Parse the requested activity fields."""
+    return parse_fields(request.args.get('fields'), ACTIVITY_FIELDS)
 
 
 @blueprint.route('/event/current/projects.json')
 def project_list_current_json():
     """Output JSON of projects in the current event with its info."""
-    event = Event.query.filter_by(is_current=True).first() or \
+    event = Event.current() or \
         Event.query.order_by(Event.id.desc()).first_or_404()
     return jsonify(projects=request_project_list(event.id), event=event.data)
 
@@ -102,7 +111,7 @@ def project_list_event_csv(event_id):
 @blueprint.route('/event/current/projects.csv')
 def project_list_current_csv():
     """Output CSV of projects and challenges in the current event."""
-    event = Event.query.filter_by(is_current=True).first() or \
+    event = Event.current() or \
         Event.query.order_by(Event.id.desc()).first_or_404()
     return project_list_csv(event.id, event.name)
 
@@ -110,7 +119,7 @@ def project_list_current_csv():
 @blueprint.route('/event/current/categories.json')
 def categories_list_current_json():
     """Output JSON of categories in the current event."""
-    event = Event.query.filter_by(is_current=True).first()
+    event = Event.current()
     categories = [c.data for c in event.categories_for_event()]
     return jsonify(categories=categories, event=event.data)
 
@@ -124,13 +133,14 @@ def event_activity_json(event_id):
     q = request.args.get('q') or None
     if q and len(q) < 3:
         q = None
-    return jsonify(activities=get_event_activities(event_id, limit, q))
+    return jsonify(activities=get_event_activities(
+        event_id, limit, q, fields=request_activity_fields()))
 
 
 @blueprint.route('/event/current/activity.json')
 def event_activity_current_json():
     """Output JSON of categories in the current event."""
-    event = Event.query.filter_by(is_current=True).first()
+    event = Event.current()
     if not event:
         return jsonify(activities=[])
     return event_activity_json(event.id)
@@ -156,7 +166,8 @@ def projects_activity_json():
     q = request.args.get('q') or None
     if q and len(q) < 3:
         q = None
-    return jsonify(activities=get_event_activities(None, limit, q))
+    return jsonify(activities=get_event_activities(
+        None, limit, q, fields=request_activity_fields()))
 
 
 @blueprint.route('/project/posts.json')
@@ -166,7 +177,8 @@ def projects_posts_json():
     q = request.args.get('q') or None
     if q and len(q) < 3:
         q = None
-    return jsonify(activities=get_event_activities(None, limit, q, "post"))
+    return jsonify(activities=get_event_activities(
+        None, limit, q, "post", request_activity_fields()))
 
 
 @blueprint.route('/project/<int:project_id>/activity.json')
@@ -175,8 +187,12 @@ def project_activity_json(project_id):
     limit = request.args.get('limit') or 10
     project = Project.query.filter_by(id=project_id).first_or_404()
     query = Activity.query.filter_by(project_id=project.id).order_by(
-        Activity.id.desc()).limit(limit).all()
-    activities = [a.data for a in query]
+        Activity.id.desc()).limit(limit)
+    fields = request_activity_fields()
+    if fields:
+        activities = select_fields(query, Activity, fields)
+    else:
+        activities = [a.data for a in query.all()]
     return jsonify(project=project.data, activities=activities)
 
 
@@ -328,7 +344,7 @@ def project_push_json():
         project.user_id = 1
         project.progress = 0
         project.is_autoupdate = True
-        project.event = Event.query.filter_by(is_current=True).first()
+        project.event = Event.current()
     elif project.user_id != 1 or project.is_hidden:
         return jsonify(error='Access denied')
     set_project_values(project, data)
@@ -423,6 +439,7 @@ def project_uploader():
     else:
         s3_filepath = filename
     # print('Uploading to %s' % s3_filepath)
+    import boto3
     if 'S3_ENDPOINT' in current_app.config:
         s3_obj = boto3.client(
             service_name='s3',
@@ -473,7 +490,7 @@ def generate_event_package(event, format='json'):
 @blueprint.route('/event/current/datapackage.<format>', methods=["GET"])
 def package_current_event(format):
     """Download a Data Package for an event."""
-    event = Event.query.filter_by(is_current=True).first() or \
+    event = Event.current() or \
         Event.query.order_by(Event.id.desc()).first_or_404()
     return generate_event_package(event, format)
 
@@ -2,21 +2,20 @@
 """Authentication views."""
 
 from flask import (Blueprint, request, render_template, flash, url_for,
-                   redirect, current_app)
+                   redirect, current_app, session)
 from flask_login import login_user, logout_user, login_required, current_user
-from flask_dance.contrib.slack import slack
-from flask_dance.contrib.azure import azure  # noqa: I005
-from flask_dance.contrib.github import github
-from dribdat.sso.auth0 import auth0
-from dribdat.sso.mattermost import mattermost
 # Dribdat modules
-from dribdat.user.models import User, Event, Role
-from dribdat.extensions import login_manager  # noqa: I005
+from dribdat.user.models import (
+    User, Event, Role, detached_instance, attach_copy,
+)
+from dribdat.extensions import login_manager, cache  # noqa: I005
 from dribdat.utils import flash_errors, random_password, sanitize_input
 from dribdat.user.forms import RegisterForm, EmailForm, LoginForm, UserForm
 from dribdat.database import db
 from dribdat.mailer import user_activation
 from datetime import datetime
+from time import time
+from sqlalchemy.orm.attributes import set_committed_value
 # noqa: I005
 
 blueprint = Blueprint('auth', __name__, static_folder="../static")
@@ -24,13 +23,51 @@ blueprint = Blueprint('auth', __name__, static_folder="../static")
 
 def current_event():
     """Return the first featured event."""
-    return Event.query.filter_by(is_current=True).first()
+    return Event.current()
+
+
+def remember_user(user):
+    """Keep a snapshot of the user and roles in the session."""
+    session['user_snapshot'] = {
+        'id': user.id,
+        'username': user.username,
+        'is_admin': user.is_admin,
+        'active': user.active,
+        'roles': [[r.id, r.name] for r in user.roles],
+        'version': cache.version('user-%d' % user.id),
+        'expires': time() + current_app.config['USER_SESSION_TTL'],
+    }
+
+
+def cached_user(user_id):
+    """Restore the user from a fresh session snapshot, without a query."""
+    snapshot = session.get('user_snapshot')
+    if not snapshot or snapshot['id'] != user_id \
+       or snapshot['expires'] < time() \
+       or snapshot['version'] != cache.version('user-%d' % user_id):
+        return None
+    user = attach_copy(detached_instance(User, {
+        key: snapshot[key] for key in ('id', 'username', 'is_admin', 'active')
+    }))
+    if 'roles' not in user.__dict__:
+        set_committed_value(user, 'roles', [
+            attach_copy(detached_instance(Role, {'id': rid, 'name': name}))
+            for rid, name in snapshot['roles']])
+    return user
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    """Load user by ID."""
-    return User.get_by_id(int(user_id))
+    """Load user by ID, or from the session for USER_SESSION_TTL seconds."""
+    # Changes to the user are only seen by all workers with a shared cache
+    if current_app.config['USER_SESSION_TTL'] <= 0 or not cache.is_shared:
+        return User.get_by_id(int(user_id))
+    user = cached_user(int(user_id))
+    if user is None:
+        user = User.get_by_id(int(user_id))
+        if user is not None:
+            remember_user(user)
+    return user
 
 
 def oauth_type():
@@ -142,6 +179,7 @@ def activate(userid, userhash):
 def logout():
     """Logout."""
     logout_user()
+    session.pop('user_snapshot', None)
     flash('You are logged out.', 'info')
     return redirect(url_for('public.home'))
 
@@ -303,6 +341,7 @@ def get_or_create_sso_user(sso_id, sso_name, sso_email, sso_webpage=''):
 @blueprint.route("/slack_login", methods=["GET", "POST"])
 def slack_login():
     """Handle login via Slack."""
+    from flask_dance.contrib.slack import slack
     if not slack.authorized:
         flash('Access denied to Slack', 'danger')
         return redirect(url_for("auth.login", local=1))
@@ -327,6 +366,7 @@ def slack_login():
 @blueprint.route("/azure_login", methods=["GET", "POST"])
 def azure_login():
     """Handle login via Azure."""
+    from flask_dance.contrib.azure import azure
     if not azure.authorized:
         flash('Access denied to Azure', 'danger')
         return redirect(url_for("auth.login", local=1))
@@ -350,6 +390,7 @@ def azure_login():
 @blueprint.route("/github_login", methods=["GET", "POST"])
 def github_login():
     """Handle login via GitHub."""
+    from flask_dance.contrib.github import github
     if not github.authorized:
         flash('Access denied - please try again', 'warning')
         return redirect(url_for("auth.login", local=1))
@@ -383,6 +424,7 @@ def github_login():
 @blueprint.route("/auth0_login", methods=["GET", "POST"])
 def auth0_login():
     """Handle login via Auth0."""
+    from dribdat.sso.auth0 import auth0
     if not auth0.authorized:
         flash('Access denied to Auth0', 'danger')
         return redirect(url_for("auth.login", local=1))
@@ -406,6 +448,7 @@ def auth0_login():
 @blueprint.route("/mattermost_login", methods=["GET", "POST"])
 def mattermost_login():
     """Handle login via Mattermost."""
+    from dribdat.sso.mattermost import mattermost
     if not mattermost.authorized:
         flash('Access denied to Mattermost', 'danger')
         return redirect(url_for("auth.login", local=1))
@@ -19,6 +19,7 @@ from dribdat.user import (
 from dribdat.public.projhelper import (
     project_action, project_edit_action, resources_by_stage
 )
+from dribdat.versioning import revert_to_version
 from ..decorators import admin_required
 
 blueprint = Blueprint('project', __name__,
@@ -215,9 +216,12 @@ def post_revert(project_id, activity_id):
     elif activity.project_version == 0:
         flash('Could not revert: this is the earliest version.', 'warning')
     else:
-        revert_to = activity.project_version
-        project.versions[revert_to - 1].revert()
-        flash('Project data reverted to version %d.' % revert_to, 'success')
+        version = revert_to_version(project, activity.project_version)
+        if version is None:
+            flash('Could not revert: data not available.', 'warning')
+            return redirect(purl)
+        flash('Project data reverted to version %d.' %
+              version.version_count, 'success')
         return project_view(project.id)
     return redirect(purl)
 
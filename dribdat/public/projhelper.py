@@ -18,6 +18,7 @@ from dribdat.user import (
 )
 from dribdat.database import db
 from dribdat.extensions import cache
+from sqlalchemy.orm import joinedload, undefer_group
 
 
 def current_event():
@@ -36,13 +37,34 @@ def resources_by_stage(progress, resource_event=False):
     if resource_event:
         # No need to make suggestions in a Resource event
         return []
-    project_list = []
-    resource_events = [e.id for e in Event.query.filter_by(
-        lock_resources=True, is_hidden=False).all()]
-    for eid in resource_events:
-        projects = Project.query.filter_by(
-            event_id=eid, is_hidden=False, progress=progress)
-        project_list.extend([p.data for p in projects.all()])
+    projects = Project.query.join(
+        Event, Event.id == Project.event_id
+    ).filter(
+        Event.lock_resources.is_(True),
+        Event.is_hidden.isnot(True),
+        Project.is_hidden.isnot(True),
+        Project.progress == progress,
+    )
+    # Each change to a project counts a new version, so the number of
+    # projects and their versions tell if the list is current
+    count, versions = projects.with_entities(
+        db.func.count(Project.id), db.func.sum(Project.version_count),
+    ).one()
+    cache_key = 'resources-%s-%d-%d' % (progress, count, versions or 0)
+    project_list = cache.get(cache_key)
+    if project_list is not None:
+        return project_list
+    # Only the fields shown in the suggestion cards
+    projects = projects.with_entities(
+        Project.id, Project.name, Project.summary, Project.image_url,
+    ).order_by(Event.id, Project.id)
+    project_list = [{
+        'id': p.id,
+        'name': p.name,
+        'summary': p.summary or '',
+        'image_url': p.image_url or '',
+    } for p in projects]
+    cache.set(cache_key, project_list)
     return project_list
 
 
@@ -105,27 +127,14 @@ def project_edit_action(project_id, detail_view=False):
     )
 
 
-def project_action(project_id, of_type=None, as_view=True, then_redirect=False,
-                   action=None, text=None, for_user=current_user):
-    """Mother of all project actions."""
-    project = Project.query.filter_by(id=project_id).first_or_404()
+def project_page_data(project, for_user):
+    """Collect the team, roles and timeline shown on a project page."""
     event = project.event
-    if of_type is not None:
-        ProjectActivity(project, of_type, for_user, action, text)
-    if not as_view:
-        return True
-    if then_redirect:
-        return redirect(url_for('project.project_view', project_id=project.id))
-    # The next line seems rather inefficient
-    starred = IsProjectStarred(project, for_user)
-    # Figure out permissions (hackybehack!)
-    allow_edit = not current_user.is_anonymous and current_user.is_admin
-    lock_editing = event.lock_editing
-    allow_post = starred and not event.lock_resources
-    allow_edit = (starred or allow_edit) and not lock_editing
-
-    # Obtain list of team members (performance!)
+    # The team is loaded once, with the roles of each member
     project_team = project.get_team()
+    starred = isUserActive(for_user) and \
+        any(u.id == for_user.id for u in project_team)
+    allow_post = starred and not event.lock_resources
     if allow_post:
         # Evaluate project progress
         stage, all_valid = validateProjectData(project)
@@ -136,7 +145,7 @@ def project_action(project_id, of_type=None, as_view=True, then_redirect=False,
             suggestions = resources_by_stage(project.progress)
 
         # Suggest missing team roles
-        missing_roles = project.get_missing_roles()
+        missing_roles = project.get_missing_roles(project_team)
     else:
         suggestions, stage, all_valid, missing_roles = None, None, None, None
 
@@ -149,6 +158,40 @@ def project_action(project_id, of_type=None, as_view=True, then_redirect=False,
         project_dribs = project.all_dribs()
         project_badge = [s for s in project_dribs if s['name'] == 'boost']
 
+    return {
+        'project_starred': starred,
+        'project_team': project_team,
+        'project_dribs': project_dribs,
+        'project_badge': project_badge,
+        'missing_roles': missing_roles,
+        'allow_post': allow_post,
+        'stage': stage,
+        'all_valid': all_valid,
+        'suggestions': suggestions,
+    }
+
+
+def project_action(project_id, of_type=None, as_view=True, then_redirect=False,
+                   action=None, text=None, for_user=current_user):
+    """Mother of all project actions."""
+    project = Project.query.filter_by(id=project_id).options(
+        undefer_group('text'),
+        joinedload(Project.event).undefer_group('text'),
+        joinedload(Project.category),
+    ).first_or_404()
+    event = project.event
+    if of_type is not None:
+        ProjectActivity(project, of_type, for_user, action, text)
+    if not as_view:
+        return True
+    if then_redirect:
+        return redirect(url_for('project.project_view', project_id=project.id))
+    page = project_page_data(project, for_user)
+    # Figure out permissions (hackybehack!)
+    allow_edit = not current_user.is_anonymous and current_user.is_admin
+    lock_editing = event.lock_editing
+    allow_edit = (page['project_starred'] or allow_edit) and not lock_editing
+
     # Select available project image
     if project.image_url:
         project_image_url = project.image_url
@@ -169,12 +212,8 @@ def project_action(project_id, of_type=None, as_view=True, then_redirect=False,
     # Dump all that data into a template
     return render_template(
         'public/project.html', current_event=event, project=project,
-        project_starred=starred, project_team=project_team,
-        project_badge=project_badge, project_dribs=project_dribs,
         project_image_url=project_image_url,
-        allow_edit=allow_edit, allow_post=allow_post,
-        lock_editing=lock_editing, missing_roles=missing_roles,
-        stage=stage, all_valid=all_valid,
-        suggestions=suggestions, share=share,
-        active="projects"
+        project_version='%d-%d' % (project.id, project.version_count or 0),
+        allow_edit=allow_edit, lock_editing=lock_editing,
+        share=share, active="projects", **page
     )
@@ -12,7 +12,9 @@ from dribdat.aggregation import GetEventUsers
 from dribdat.user import getProjectStages, isUserActive
 from urllib.parse import quote, quote_plus, urlparse
 from datetime import datetime
+from functools import lru_cache, partial
 from sqlalchemy import or_
+from sqlalchemy.orm import undefer, undefer_group
 import re
 
 blueprint = Blueprint('public', __name__, static_folder="../static")
@@ -51,8 +53,8 @@ def dashboard():
 def info_current_hackathon_json():
     """Output JSON-LD about the current event."""
     # (see also api.py/info_event_hackathon_json)
-    event = Event.query.filter_by(is_current=True).first(
-    ) or Event.query.order_by(Event.id.desc()).first()
+    event = Event.current() or \
+        Event.query.order_by(Event.id.desc()).first()
     return jsonify(event.get_schema(request.host_url))
 
 
@@ -69,16 +71,15 @@ def favicon():
     return redirect(url_for('static', filename='img/favicon.ico'))
 
 
-@blueprint.route("/")
-def home():
-    """Home page."""
-    cur_event = current_event()
+def home_events(cur_event):
+    """Collect the events listed on the home page."""
     if cur_event is not None:
         events = Event.query.filter(Event.id != cur_event.id)
     else:
         events = Event.query
-    # Skip any hidden events
-    events = events.filter(Event.is_hidden.isnot(True))
+    # Skip any hidden events, load descriptions for the list
+    events = events.filter(Event.is_hidden.isnot(True)).options(
+        undefer(Event.description))
     # Query upcoming and past events which are not resource-typed
     timed_events = events.filter(Event.lock_resources.isnot(
         True)).order_by(Event.starts_at.desc())
@@ -90,21 +91,31 @@ def home():
     # Select Resource-type events
     resource_events = events.filter(Event.lock_resources)
     resource_events = resource_events.order_by(Event.name.asc())
+    # Filter past events
+    MAX_PAST_EVENTS = 6
+    events_past = events_past.limit(MAX_PAST_EVENTS + 1).all()
+    return {
+        'featured': events_featured.all(),
+        'tips': resource_events.all(),
+        'next': events_next.all(),
+        'past': events_past[:MAX_PAST_EVENTS],
+        'past_next': len(events_past) > MAX_PAST_EVENTS,
+    }
+
+
+@blueprint.route("/")
+def home():
+    """Home page."""
+    cur_event = current_event()
     # Select my challenges
     my_projects = None
     if current_user and not current_user.is_anonymous:
         my_projects = current_user.joined_projects(True, 3)
-    # Filter past events
-    MAX_PAST_EVENTS = 6
-    events_past_next = events_past.count() > MAX_PAST_EVENTS
-    events_past = events_past.limit(MAX_PAST_EVENTS).all()
-    # Send to template
+    # The events are queried once, and only when the cached page is stale
+    events = lru_cache(maxsize=None)(partial(home_events, cur_event))
     return render_template("public/home.html", active="home",
-                           events_featured=events_featured.all(),
-                           events_tips=resource_events.all(),
-                           events_next=events_next.all(),
-                           events_past=events_past,
-                           events_past_next=events_past_next,
+                           home_events=events,
+                           events_version=cache.version('events'),
                            my_projects=my_projects,
                            current_event=cur_event)
 
@@ -112,8 +123,9 @@ def home():
 @blueprint.route("/history")
 def events_past():
     """List all past events."""
-    # Skip any hidden events
-    events = Event.query.filter(Event.is_hidden.isnot(True))
+    # Skip any hidden events, load descriptions for the list
+    events = Event.query.filter(Event.is_hidden.isnot(True)).options(
+        undefer(Event.description))
     # Query past events which are not resource-typed
     today = datetime.utcnow()
     timed_events = events.filter(Event.lock_resources.isnot(
@@ -178,7 +190,8 @@ def user_cert():
 @blueprint.route("/event/<int:event_id>")
 def event(event_id):
     """Show an event."""
-    event = Event.query.filter_by(id=event_id).first_or_404()
+    event = Event.query.filter_by(id=event_id).options(
+        undefer_group('text')).first_or_404()
     projects = Project.query.filter_by(event_id=event_id, is_hidden=False)
     if request.args.get('embed'):
         return render_template("public/embed.html",
@@ -252,6 +265,8 @@ def event_print(event_id):
     now = datetime.utcnow().strftime("%d.%m.%Y %H:%M")
     event = Event.query.filter_by(id=event_id).first_or_404()
     eventdata = Project.query.filter_by(event_id=event_id, is_hidden=False)
+    if request.args.get('longtext'):
+        eventdata = eventdata.options(undefer_group('text'))
     projects = eventdata.filter(Project.progress >= 0).order_by(Project.name)
     challenges = eventdata.filter(Project.progress < 0).order_by(Project.name)
     return render_template('public/eventprint.html', active='print',
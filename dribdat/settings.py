@@ -48,6 +48,13 @@ class Config(object):
     MAIL_DEFAULT_SENDER = os_env.get('MAIL_DEFAULT_SENDER', None)
     MAIL_USE_TLS = bool(strtobool(os_env.get('MAIL_USE_TLS', 'False')))
     MAIL_USE_SSL = bool(strtobool(os_env.get('MAIL_USE_SSL', 'False')))
+    # Outbound mail is queued in a spool folder, see mailer.py
+    MAIL_SPOOL = os_env.get('MAIL_SPOOL', os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'mailq'))
+    MAIL_WORKER = bool(strtobool(os_env.get('MAIL_WORKER', 'True')))
+    MAIL_QUEUE_INTERVAL = int(os_env.get('MAIL_QUEUE_INTERVAL', 10))
+    MAIL_MAX_RETRIES = int(os_env.get('MAIL_MAX_RETRIES', 5))
+    MAIL_BATCH_SIZE = int(os_env.get('MAIL_BATCH_SIZE', 50))
 
     # Application settings
     APP_DIR = os.path.abspath(os.path.dirname(__file__))  # This directory
@@ -65,11 +72,34 @@ class Config(object):
     SERVER_SSL = bool(strtobool(os_env.get('SERVER_SSL', 'False')))
     SERVER_CORS = bool(strtobool(os_env.get('SERVER_CORS', 'True')))
     SERVER_PROXY = bool(strtobool(os_env.get('SERVER_PROXY', 'False')))
+    SERVER_METRICS = bool(strtobool(os_env.get('SERVER_METRICS', 'False')))
+    # Metrics are kept per process: with several workers, set a folder
+    # where they are shared, and empty it when the server (re)starts
+    METRICS_DIR = os_env.get('METRICS_DIR', '')
     CSP_DIRECTIVES = os_env.get(
         'CSP_DIRECTIVES', "default-src * 'unsafe-inline' 'unsafe-eval' data:")
     TIME_ZONE = os_env.get('TIME_ZONE', 'UTC')
     MAX_CONTENT_LENGTH = int(os_env.get('MAX_CONTENT_LENGTH', 1 * 1024 * 1024))
 
+    # Remote embeds are resolved in the background and kept this long
+    ONEBOX_TTL = int(os_env.get('ONEBOX_TTL', 7 * 24 * 3600))
+    ONEBOX_WORKERS = int(os_env.get('ONEBOX_WORKERS', 2))
+
+    # Seconds to keep the featured event in each process
+    CURRENT_EVENT_TTL = int(os_env.get('CURRENT_EVENT_TTL', 30))
+
+    # Seconds to trust the user details kept in the session, if the cache
+    # is shared by the workers (e.g. Redis or Memcached)
+    USER_SESSION_TTL = int(os_env.get('USER_SESSION_TTL', 60))
+
+    # Compiled templates are shared by the workers in this folder
+    JINJA_CACHE_DIR = os_env.get('JINJA_CACHE_DIR', os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        'jinja-cache'))
+
+    # Old project versions are thinned out, see versioning.py
+    VERSIONS_KEEP = int(os_env.get('VERSIONS_KEEP', 10))
+
     # Configure web analytics providers
     ANALYTICS_HREF = os_env.get('ANALYTICS_HREF', None)
     ANALYTICS_SIMPLE = os_env.get('ANALYTICS_SIMPLE', None)
@@ -137,3 +167,6 @@ class TestConfig(Config):
     # SERVER_NAME = 'localhost.localdomain' #results in 404 errors
     WTF_CSRF_ENABLED = False  # Allows form testing
     PRESERVE_CONTEXT_ON_EXCEPTION = False
+    SERVER_METRICS = True
+    MAIL_WORKER = False  # Deliver the mail queue explicitly
+    JINJA_CACHE_DIR = ''  # Compile templates in memory
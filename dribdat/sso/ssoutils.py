@@ -1,7 +1,5 @@
 # -*- coding: utf-8 -*-
 """Helper functions for authentication steps."""
-from flask_dance.contrib import (slack, azure, github)
-from dribdat.sso import (auth0, mattermost)
 
 
 def get_auth_blueprint(app):
@@ -9,7 +7,9 @@ def get_auth_blueprint(app):
     if 'OAUTH_TYPE' not in app.config or not app.config['OAUTH_TYPE']:
         return None
     blueprint = None
+    # Only the configured provider is imported
     if app.config['OAUTH_TYPE'] == 'slack':
+        from flask_dance.contrib import slack
         blueprint = slack.make_slack_blueprint(
             client_id=app.config['OAUTH_ID'],
             client_secret=app.config['OAUTH_SECRET'],
@@ -22,6 +22,7 @@ def get_auth_blueprint(app):
             subdomain=app.config['OAUTH_DOMAIN'],
         )
     elif app.config['OAUTH_TYPE'] == 'azure':
+        from flask_dance.contrib import azure
         blueprint = azure.make_azure_blueprint(
             client_id=app.config['OAUTH_ID'],
             client_secret=app.config['OAUTH_SECRET'],
@@ -31,6 +32,7 @@ def get_auth_blueprint(app):
             login_url="/login",
         )
     elif app.config['OAUTH_TYPE'] == 'github':
+        from flask_dance.contrib import github
         blueprint = github.make_github_blueprint(
             client_id=app.config['OAUTH_ID'],
             client_secret=app.config['OAUTH_SECRET'],
@@ -39,6 +41,7 @@ def get_auth_blueprint(app):
             login_url="/login",
         )
     elif app.config['OAUTH_TYPE'] == 'auth0':
+        from dribdat.sso import auth0
         blueprint = auth0.make_auth0_blueprint(
             client_id=app.config['OAUTH_ID'],
             secret=app.config['OAUTH_SECRET'],
@@ -47,6 +50,7 @@ def get_auth_blueprint(app):
             login_url="/login",
         )
     elif app.config['OAUTH_TYPE'] == 'mattermost':
+        from dribdat.sso import mattermost
         blueprint = mattermost.make_mattermost_blueprint(
             client_id=app.config['OAUTH_ID'],
             secret=app.config['OAUTH_SECRET'],
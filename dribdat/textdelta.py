@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""Compressed line deltas between revisions of a text.
+
+A delta is a list of operations which rebuild the new text from the old
+one: a pair of numbers copies a range of old lines, a string is new text.
+Keyframes store the whole text, so that rebuilding a revision only needs
+the deltas since the last keyframe.
+"""
+import json
+import zlib
+from difflib import SequenceMatcher
+
+# Store the whole text after this many deltas
+KEYFRAME_INTERVAL = 20
+
+
+def pack_text(text):
+    """Compress a whole text into a keyframe."""
+    return zlib.compress((text or '').encode('utf-8'))
+
+
+def unpack_text(data):
+    """Decompress a keyframe."""
+    return zlib.decompress(data).decode('utf-8')
+
+
+def make_delta(old, new):
+    """Compress the changes from an old to a new text."""
+    old_lines = (old or '').splitlines(True)
+    new_lines = (new or '').splitlines(True)
+    ops = []
+    matcher = SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif tag in ('replace', 'insert'):
+            ops.append(''.join(new_lines[j1:j2]))
+    return zlib.compress(json.dumps(ops).encode('utf-8'))
+
+
+def apply_delta(old, data):
+    """Rebuild the new text from the old one and a delta."""
+    old_lines = (old or '').splitlines(True)
+    parts = []
+    for op in json.loads(zlib.decompress(data).decode('utf-8')):
+        if isinstance(op, list):
+            parts.extend(old_lines[op[0]:op[1]])
+        else:
+            parts.append(op)
+    return ''.join(parts)
@@ -1,8 +1,15 @@
 # -*- coding: utf-8 -*-
 """User models."""
 
-from sqlalchemy import Table, or_
+from sqlalchemy import (
+    Table, or_, select, event as sa_event, inspect as sa_inspect,
+)
+from sqlalchemy.orm import (
+    joinedload, selectinload, deferred, undefer_group, Session,
+    make_transient_to_detached,
+)
 from sqlalchemy_continuum import make_versioned
+from sqlalchemy_continuum.utils import is_modified as is_versioned_change
 from sqlalchemy_continuum.plugins import FlaskPlugin
 from dribdat.user.constants import (
     MAX_EXCERPT_LENGTH,
@@ -23,19 +30,18 @@ from dribdat.database import (
     relationship,
     reference_col,
 )
-from dribdat.extensions import hashing
+from dribdat.extensions import hashing, cache
 from dribdat.apifetch import FetchGitlabAvatar
+from dribdat.textdelta import KEYFRAME_INTERVAL, pack_text, make_delta
 from flask import current_app
+from markupsafe import Markup
 from flask_login import UserMixin
-from time import mktime
+from time import mktime, monotonic
 from dateutil.parser import parse
 import datetime as dt
 import hashlib
 import re
 from urllib.parse import urlencode, urlparse
-# Standard library fix
-from future.standard_library import install_aliases
-install_aliases()  # noqa: I005
 
 
 # Set up user roles mapping
@@ -168,19 +174,22 @@ class User(UserMixin, PkModel):
 
     def joined_projects(self, with_challenges=True, limit=-1):
         """Retrieve all projects user has joined."""
-        activities = Activity.query.filter_by(
-                user_id=self.id, name='star'
-            ).order_by(Activity.timestamp.desc())
-        if limit < 0:
-            activities = activities.all()
-        else:
-            activities = activities.limit(limit)
-        projects = []
-        for a in activities:
-            if a.project not in projects and not a.project.is_hidden:
-                if with_challenges or a.project.progress != 0:
-                    projects.append(a.project)
-        return projects
+        projects = Project.query.join(
+                Activity, Activity.project_id == Project.id
+            ).filter(
+                Activity.user_id == self.id,
+                Activity.name == 'star',
+                Project.is_hidden.isnot(True)
+            )
+        if not with_challenges:
+            projects = projects.filter(or_(
+                Project.progress != 0, Project.progress.is_(None)))
+        # Most recently joined first, each project once
+        projects = projects.group_by(Project.id).order_by(
+                db.func.max(Activity.timestamp).desc())
+        if limit >= 0:
+            projects = projects.limit(limit)
+        return projects.all()
 
     def posted_challenges(self):
         """Retrieve all challenges user has posted."""
@@ -276,6 +285,43 @@ class User(UserMixin, PkModel):
         return '<User({username!r})>'.format(username=self.username)
 
 
+def detached_instance(cls, values):
+    """Make a detached instance of a model from its column values."""
+    obj = sa_inspect(cls).class_manager.new_instance()
+    for key, value in values.items():
+        setattr(obj, key, value)
+    make_transient_to_detached(obj)
+    return obj
+
+
+def detached_copy(obj):
+    """Copy the loaded columns of an object into a detached instance."""
+    state = sa_inspect(obj)
+    return detached_instance(type(obj), {
+        column.key: state.dict[column.key]
+        for column in state.mapper.column_attrs
+        if column.key in state.dict})
+
+
+def attach_copy(obj):
+    """Add a detached instance to the session without a query."""
+    # Use the object if it is already in the session
+    loaded = db.session.identity_map.get(sa_inspect(obj).key)
+    if loaded is not None:
+        return loaded
+    return db.session.merge(obj, load=False)
+
+
+# Process-local snapshot of the featured event, see Event.current
+_current_event = None
+
+
+def forget_current_event():
+    """Drop the snapshot of the featured event in this process."""
+    global _current_event
+    _current_event = None
+
+
 class Event(PkModel):
     """Tell me what is a-happening here."""
 
@@ -286,8 +332,11 @@ class Event(PkModel):
     location = Column(db.String(255), nullable=True)
     hashtags = Column(db.String(255), nullable=True)
 
-    description = Column(db.UnicodeText(), nullable=True)
-    boilerplate = Column(db.UnicodeText(), nullable=True)
+    # Large texts are only loaded when used, or with undefer_group('text')
+    description = deferred(
+        Column(db.UnicodeText(), nullable=True), group='text')
+    boilerplate = deferred(
+        Column(db.UnicodeText(), nullable=True), group='text')
     instruction = Column(db.UnicodeText(), nullable=True)
 
     logo_url = Column(db.String(255), nullable=True)
@@ -298,8 +347,10 @@ class Event(PkModel):
     starts_at = Column(db.DateTime, nullable=False, default=dt.datetime.utcnow)
     ends_at = Column(db.DateTime, nullable=False, default=dt.datetime.utcnow)
 
-    custom_css = Column(db.UnicodeText(), nullable=True)
-    community_embed = Column(db.UnicodeText(), nullable=True)
+    custom_css = deferred(
+        Column(db.UnicodeText(), nullable=True), group='text')
+    community_embed = deferred(
+        Column(db.UnicodeText(), nullable=True), group='text')
     certificate_path = Column(db.String(1024), nullable=True)
 
     is_hidden = Column(db.Boolean(), default=False)
@@ -308,6 +359,9 @@ class Event(PkModel):
     lock_starting = Column(db.Boolean(), default=False)
     lock_resources = Column(db.Boolean(), default=False)
 
+    # Number of projects, see counts_by_event
+    _project_count = None
+
     @property
     def data(self):
         """Get JSON representation."""
@@ -462,9 +516,10 @@ class Event(PkModel):
     @property
     def project_count(self):
         """Return number of projects."""
-        if not self.projects:
-            return 0
-        return len(self.projects)
+        if self._project_count is None:
+            self._project_count = Project.query.filter_by(
+                event_id=self.id).count()
+        return self._project_count
 
     def categories_for_event(self):
         """Event categories."""
@@ -480,9 +535,29 @@ class Event(PkModel):
         return self.categories_for_event().count() > 0
 
     def current():
-        """Return currently featured event."""
-        # TODO: allow multiple featurettes?
-        return Event.query.filter_by(is_current=True).first()
+        """Return currently featured event.
+
+        The event is kept in a snapshot for CURRENT_EVENT_TTL seconds, or
+        until the events change, and attached to the session without a
+        query.
+        """
+        global _current_event
+        ttl = current_app.config['CURRENT_EVENT_TTL']
+        version = cache.version('events')
+        snapshot = _current_event
+        if snapshot is None or snapshot[0] < monotonic() \
+           or snapshot[1] != version:
+            # TODO: allow multiple featurettes?
+            event = Event.query.filter_by(is_current=True).options(
+                undefer_group('text')).first()
+            if ttl <= 0:
+                return event
+            snapshot = (monotonic() + ttl, version,
+                        event and detached_copy(event))
+            _current_event = snapshot
+        if snapshot[2] is None:
+            return None
+        return attach_copy(snapshot[2])
 
     def __init__(self, name=None, **kwargs):  # noqa: D107
         if name:
@@ -495,7 +570,8 @@ class Event(PkModel):
 class Project(PkModel):
     """You know, for kids."""
 
-    __versioned__ = {}
+    # The long texts are stored as deltas, see ProjectTextDelta
+    __versioned__ = {'exclude': ['longtext', 'autotext']}
     __tablename__ = 'projects'
     name = Column(db.String(80), unique=True, nullable=False)
     summary = Column(db.String(140), nullable=True)
@@ -513,8 +589,16 @@ class Project(PkModel):
     # remotely managed (by bot)
     is_autoupdate = Column(db.Boolean(), default=True)
 
-    autotext = Column(db.UnicodeText(), nullable=True, default=u"")
-    longtext = Column(db.UnicodeText(), nullable=False, default=u"")
+    # Large texts are only loaded when used, or with undefer_group('text')
+    autotext = deferred(Column(
+        db.UnicodeText(), nullable=True, default=u""),
+        group='text', active_history=True)
+    longtext = deferred(Column(
+        db.UnicodeText(), nullable=False, default=u""),
+        group='text', active_history=True)
+    # Start of the texts, kept up to date on write, see update_excerpt
+    excerpt = Column(db.UnicodeText(), nullable=True)
+    excerpt_plain = Column(db.UnicodeText(), nullable=True)
 
     logo_color = Column(db.String(7), nullable=True)
     logo_icon = Column(db.String(40), nullable=True)  # currently not used
@@ -523,6 +607,8 @@ class Project(PkModel):
                         default=dt.datetime.utcnow)
     updated_at = Column(db.DateTime, nullable=False,
                         default=dt.datetime.utcnow)
+    # Number of the latest version, see count_project_versions
+    version_count = Column(db.Integer, nullable=True, default=1)
 
     # User who created the project
     user_id = reference_col('users', nullable=True)
@@ -608,20 +694,10 @@ class Project(PkModel):
             'contact_url': self.contact_url or '',
             'logo_color': self.logo_color or '',
             'logo_icon': self.logo_icon or '',
-            'excerpt': '',
+            'excerpt': self.excerpt or '',
         }
         d['created_at'] = format_date(self.created_at, '%Y-%m-%dT%H:%M')
         d['updated_at'] = format_date(self.updated_at, '%Y-%m-%dT%H:%M')
-        # Generate excerpt based on summary data
-        if self.longtext and len(self.longtext) > 10:
-            d['excerpt'] = self.longtext[:MAX_EXCERPT_LENGTH]
-            if len(self.longtext) > MAX_EXCERPT_LENGTH:
-                d['excerpt'] += '...'
-        elif self.is_autoupdateable:
-            if self.autotext and len(self.autotext) > 10:
-                d['excerpt'] = self.autotext[:MAX_EXCERPT_LENGTH]
-                if len(self.autotext) > MAX_EXCERPT_LENGTH:
-                    d['excerpt'] += '...'
         if self.user is not None:
             d['maintainer'] = self.user.username
         if self.event is not None:
@@ -640,20 +716,24 @@ class Project(PkModel):
 
     def get_team(self):
         """Return all starring users (A team)."""
-        activities = Activity.query.filter_by(
-            name='star', project_id=self.id
-        ).all()
-        members = []
-        for a in activities:
-            if a.user and a.user not in members:
-                members.append(a.user)
-        return members
-
-    def get_missing_roles(self):
+        # Members in the order they joined, with their roles
+        return User.query.join(
+                Activity, Activity.user_id == User.id
+            ).filter(
+                Activity.name == 'star',
+                Activity.project_id == self.id
+            ).options(
+                selectinload(User.roles)
+            ).group_by(User.id).order_by(
+                db.func.min(Activity.id)).all()
+
+    def get_missing_roles(self, team=None):
         """List all roles which are not yet in team."""
         get_roles = Role.query.order_by('name')
         rollcall = []
-        for p in self.get_team():
+        if team is None:
+            team = self.get_team()
+        for p in team:
             for r in p.roles:
                 if r not in rollcall:
                     rollcall.append(r)
@@ -661,8 +741,46 @@ class Project(PkModel):
 
     def all_dribs(self):
         """Query which formats the project's timeline."""
+        # Activities are only added or removed, so their number and the
+        # latest one tell if the cached timeline is current in any process
+        count, latest = db.session.query(
+            db.func.count(Activity.id), db.func.max(Activity.id)
+        ).filter(Activity.project_id == self.id).one()
+        cache_key = 'project-dribs-%d-%d-%d' % (self.id, count, latest or 0)
+        dribs = cache.get(cache_key)
+        if dribs is None:
+            dribs = self.activity_dribs()
+            cache.set(cache_key, dribs)
+        # Event markers depend on the current time, so are not cached
+        markers = []
+        if self.event.has_finished:
+            markers.append({
+                'title': "Event finished",
+                'date': self.event.ends_at,
+                'icon': 'bullhorn',
+                'name': 'finish',
+            })
+        if self.event.has_started or self.event.has_finished:
+            markers.append({
+                'title': "Event started",
+                'date': self.event.starts_at,
+                'icon': 'calendar',
+                'name': 'start',
+            })
+        # Merge both timelines, which are ordered by descending date
+        timeline = []
+        for d in dribs:
+            while markers and markers[0]['date'] > d['date']:
+                timeline.append(markers.pop(0))
+            timeline.append(d)
+        return timeline + markers
+
+    def activity_dribs(self):
+        """Format the activities of the project, newest first."""
         activities = Activity.query.filter_by(
                         project_id=self.id
+                    ).options(
+                        joinedload(Activity.user)
                     ).order_by(Activity.timestamp.desc())
         dribs = []
         prev = None
@@ -699,21 +817,7 @@ class Project(PkModel):
                 'id': a.id,
             }
             dribs.append(prev)
-        if self.event.has_started or self.event.has_finished:
-            dribs.append({
-                'title': "Event started",
-                'date': self.event.starts_at,
-                'icon': 'calendar',
-                'name': 'start',
-            })
-        if self.event.has_finished:
-            dribs.append({
-                'title': "Event finished",
-                'date': self.event.ends_at,
-                'icon': 'bullhorn',
-                'name': 'finish',
-            })
-        return sorted(dribs, key=lambda x: x['date'], reverse=True)
+        return dribs
 
     def categories_all(self, event=None):
         """Return convenience query for all categories."""
@@ -795,6 +899,22 @@ class Project(PkModel):
         self.update_null_fields()
         self.score = self.calculate_score()
 
+    def update_excerpt(self):
+        """Generate excerpts based on the project texts."""
+        text = ''
+        if self.longtext and len(self.longtext) > 10:
+            text = self.longtext
+        elif self.is_autoupdateable:
+            if self.autotext and len(self.autotext) > 10:
+                text = self.autotext
+        self.excerpt = text[:MAX_EXCERPT_LENGTH]
+        if len(text) > MAX_EXCERPT_LENGTH:
+            self.excerpt += '...'
+        plain = Markup(text).striptags()
+        self.excerpt_plain = plain[:MAX_EXCERPT_LENGTH]
+        if len(plain) > MAX_EXCERPT_LENGTH:
+            self.excerpt_plain += '...'
+
     def update_null_fields(self):
         """Reset fields in None-state."""
         if self.summary is None:
@@ -866,11 +986,15 @@ class Category(PkModel):
     event_id = reference_col('events', nullable=True)
     event = relationship('Event', backref='categories')
 
+    # Number of projects, see counts_by_category
+    _project_count = None
+
     def project_count(self):
         """Count projects in this Category."""
-        if not self.projects:
-            return 0
-        return len(self.projects)
+        if self._project_count is None:
+            self._project_count = Project.query.filter_by(
+                category_id=self.id).count()
+        return self._project_count
 
     @property
     def data(self):
@@ -908,6 +1032,29 @@ class Category(PkModel):
         return '<Category({name})>'.format(name=self.name)
 
 
+def count_projects(column, items):
+    """Count projects per value of a column in a single query."""
+    ids = [item.id for item in items]
+    if not ids:
+        return {}
+    counts = dict(db.session.query(column, db.func.count(Project.id)).filter(
+        column.in_(ids)).group_by(column).all())
+    for item in items:
+        # Remembered on the instance for the project_count accessors
+        item._project_count = counts.get(item.id, 0)
+    return {i: counts.get(i, 0) for i in ids}
+
+
+def counts_by_event(events):
+    """Return the number of projects of each event by id."""
+    return count_projects(Project.event_id, events)
+
+
+def counts_by_category(categories):
+    """Return the number of projects of each category by id."""
+    return count_projects(Project.category_id, categories)
+
+
 class Activity(PkModel):
     """Public, real time, conversational."""
 
@@ -1037,3 +1184,184 @@ class Resource(PkModel):
 
     def __repr__(self):  # noqa: D105
         return '<Resource({name})>'.format(name=self.name)
+
+
+class Embed(PkModel):
+    """Remote content resolved for a onebox."""
+
+    __tablename__ = 'embeds'
+    # Hash of the kind of embed, URL and rendering parameters
+    key = Column(db.String(64), unique=True, nullable=False, index=True)
+    url = Column(db.String(2048), nullable=True)
+    # Rendered HTML, empty if the content could not be resolved
+    html = Column(db.UnicodeText, nullable=True)
+    fetched_at = Column(db.DateTime, nullable=False,
+                        default=dt.datetime.utcnow)
+
+    def expires_in(self, ttl):
+        """Seconds until the content should be refreshed."""
+        age = dt.datetime.utcnow() - self.fetched_at
+        return int(ttl - age.total_seconds())
+
+    def __repr__(self):  # noqa: D105
+        return '<Embed({url})>'.format(url=self.url)
+
+
+# Project columns whose revisions are stored as deltas
+TEXT_DELTA_FIELDS = ('longtext', 'autotext')
+
+
+class ProjectTextDelta(PkModel):
+    """Revision of a long project text, stored as a compressed delta."""
+
+    __tablename__ = 'project_text_deltas'
+    project_id = reference_col(
+        'projects', foreign_key_kwargs={'ondelete': 'CASCADE'},
+        column_kwargs={'index': True})
+    # Name of the text column
+    field = Column(db.String(20), nullable=False)
+    # Project version_count of the revision
+    version = Column(db.Integer, nullable=False)
+    # A keyframe holds the whole text, otherwise the changes to the last
+    is_keyframe = Column(db.Boolean(), default=False)
+    data = Column(db.LargeBinary(), nullable=False)
+    created_at = Column(db.DateTime, nullable=False,
+                        default=dt.datetime.utcnow)
+
+    def __repr__(self):  # noqa: D105
+        return '<ProjectTextDelta({project_id} {field} {version})>'.format(
+            project_id=self.project_id, field=self.field,
+            version=self.version)
+
+
+def clear_user(mapper, connection, target):
+    """Invalidate the session snapshots of a user."""
+    cache.bump('user-%d' % target.id)
+
+
+for _hook in ('after_update', 'after_delete'):
+    sa_event.listen(User, _hook, clear_user)
+
+
+def clear_events(mapper, connection, target):
+    """Invalidate cached pages which list the events."""
+    cache.bump('events')
+    forget_current_event()
+
+
+for _hook in ('after_insert', 'after_update', 'after_delete'):
+    sa_event.listen(Event, _hook, clear_events)
+
+
+@sa_event.listens_for(Project, 'before_insert')
+def insert_project_excerpt(mapper, connection, target):
+    """Generate the excerpts of a new project."""
+    target.update_excerpt()
+
+
+@sa_event.listens_for(Project, 'before_update')
+def update_project_excerpt(mapper, connection, target):
+    """Refresh the excerpts when the project texts change."""
+    state = sa_inspect(target)
+    for attr in ('longtext', 'autotext', 'autotext_url'):
+        if state.attrs[attr].history.has_changes():
+            target.update_excerpt()
+            return
+
+
+# Runs ahead of the version history, which then sees the new number
+@sa_event.listens_for(Session, 'before_flush', insert=True)
+def count_project_versions(session, flush_context, instances):
+    """Count the new version of a project once per transaction.
+
+    The long texts are left out of the version history, but changing the
+    number makes a version of the columns when only the texts changed.
+    """
+    counted = session.info.setdefault('counted_projects', set())
+    for target in session.new:
+        if isinstance(target, Project):
+            counted.add(target)
+    for target in session.dirty:
+        if not isinstance(target, Project) or target in counted:
+            continue
+        state = sa_inspect(target)
+        if not is_versioned_change(target) and not any(
+                state.attrs[field].history.has_changes()
+                for field in TEXT_DELTA_FIELDS):
+            continue
+        counted.add(target)
+        # Count from the stored number, which a revert may have changed
+        history = state.attrs.version_count.history
+        count = history.deleted[0] if history.deleted \
+            else target.version_count
+        target.version_count = (count or 0) + 1
+
+
+@sa_event.listens_for(Session, 'after_commit')
+@sa_event.listens_for(Session, 'after_rollback')
+def forget_counted_projects(session):
+    """Start counting versions again in the next transaction."""
+    session.info.pop('counted_projects', None)
+
+
+def store_text_delta(connection, target, field, old, new):
+    """Record a revision of a long project text."""
+    deltas = ProjectTextDelta.__table__
+    is_keyframe = old is None
+    if not is_keyframe:
+        last_keyframe = connection.execute(
+            select(db.func.max(deltas.c.version)).where(
+                deltas.c.project_id == target.id,
+                deltas.c.field == field,
+                deltas.c.is_keyframe.is_(True),
+            )).scalar()
+        is_keyframe = last_keyframe is None
+    if not is_keyframe:
+        # Count the deltas since the last keyframe
+        since = connection.execute(select(db.func.count()).where(
+            deltas.c.project_id == target.id,
+            deltas.c.field == field,
+            deltas.c.version > last_keyframe,
+        )).scalar()
+        is_keyframe = since >= KEYFRAME_INTERVAL
+    data = pack_text(new) if is_keyframe else make_delta(old, new)
+    connection.execute(deltas.insert().values(
+        project_id=target.id,
+        field=field,
+        version=target.version_count or 1,
+        is_keyframe=is_keyframe,
+        data=data,
+        created_at=dt.datetime.utcnow(),
+    ))
+
+
+@sa_event.listens_for(Project, 'after_insert')
+def insert_project_texts(mapper, connection, target):
+    """Store the first revision of the project texts."""
+    state = sa_inspect(target)
+    for field in TEXT_DELTA_FIELDS:
+        if state.dict.get(field):
+            store_text_delta(connection, target, field, None,
+                             state.dict[field])
+
+
+@sa_event.listens_for(Project, 'after_delete')
+def delete_project_texts(mapper, connection, target):
+    """Remove the text revisions of a deleted project."""
+    deltas = ProjectTextDelta.__table__
+    connection.execute(deltas.delete().where(
+        deltas.c.project_id == target.id))
+
+
+@sa_event.listens_for(Project, 'after_update')
+def update_project_texts(mapper, connection, target):
+    """Store the changes to the project texts."""
+    state = sa_inspect(target)
+    for field in TEXT_DELTA_FIELDS:
+        history = state.attrs[field].history
+        if not history.has_changes():
+            continue
+        # Without the previous text, a keyframe is stored
+        old = history.deleted[0] if history.deleted else None
+        new = history.added[0] if history.added else None
+        store_text_delta(connection, target, field, old, new)
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""Compaction of the version history of projects.
+
+Every save of a project stores a copy of its columns, while changes to
+the long texts are stored as deltas (see textdelta.py). The latest
+versions are always kept, as is everything made until the end of the
+event. Of the older versions made after the event, only the last one of
+each day is kept, and the deltas are written again for those kept.
+"""
+from flask import current_app
+from sqlalchemy_continuum import version_class, transaction_class
+from dribdat.database import db
+from dribdat.textdelta import (
+    KEYFRAME_INTERVAL, pack_text, unpack_text, make_delta, apply_delta,
+)
+from dribdat.user.models import Project, ProjectTextDelta, TEXT_DELTA_FIELDS
+
+
+def project_versions(project):
+    """List the versions of a project with their time, oldest first."""
+    ProjectVersion = version_class(Project)
+    Transaction = transaction_class(Project)
+    return db.session.query(ProjectVersion, Transaction.issued_at).join(
+        Transaction, Transaction.id == ProjectVersion.transaction_id
+    ).filter(
+        ProjectVersion.id == project.id
+    ).order_by(ProjectVersion.transaction_id).all()
+
+
+def versions_to_prune(versions, keep, since=None):
+    """Select the versions which are not kept.
+
+    Versions are (version, issued_at) pairs, oldest first. Only versions
+    issued after the since date, if given, are thinned out.
+    """
+    older = versions[:max(len(versions) - keep, 0)]
+    prune = []
+    days = set()
+    for version, issued_at in reversed(older):
+        if since is not None and issued_at <= since:
+            continue
+        day = issued_at.date()
+        if day in days:
+            prune.append(version)
+        else:
+            days.add(day)
+    return prune
+
+
+def compact_texts(project, numbers):
+    """Store the texts of a project only for the version numbers given."""
+    for field in TEXT_DELTA_FIELDS:
+        texts = [(n, text_at_version(project, field, n)) for n in numbers]
+        ProjectTextDelta.query.filter_by(
+            project_id=project.id, field=field).delete()
+        last = None
+        since = 0
+        for number, text in texts:
+            if text == (last or ''):
+                continue
+            # Start again from the oldest text kept
+            is_keyframe = last is None or since >= KEYFRAME_INTERVAL
+            since = 0 if is_keyframe else since + 1
+            db.session.add(ProjectTextDelta(
+                project_id=project.id,
+                field=field,
+                version=number,
+                is_keyframe=is_keyframe,
+                data=pack_text(text) if is_keyframe
+                else make_delta(last, text),
+            ))
+            last = text
+
+
+def compact_versions(project, keep=None):
+    """Thin out the versions of a project, return how many were removed."""
+    if keep is None:
+        keep = current_app.config['VERSIONS_KEEP']
+    event = project.event
+    if event is not None and not event.has_finished:
+        return 0
+    versions = project_versions(project)
+    since = event.ends_at if event is not None else None
+    prune = versions_to_prune(versions, keep, since)
+    if not prune:
+        return 0
+    pruned = set(v.transaction_id for v in prune)
+    kept = [v for v, _ in versions if v.transaction_id not in pruned]
+    compact_texts(project, [v.version_count or 1 for v in kept])
+    for version in prune:
+        db.session.delete(version)
+    # Each version ends where the next kept one starts
+    for version, following in zip(kept, kept[1:]):
+        version.end_transaction_id = following.transaction_id
+    db.session.commit()
+    return len(prune)
+
+
+def compact_all_versions(keep=None):
+    """Thin out the versions of all projects, return how many were removed."""
+    if keep is None:
+        keep = current_app.config['VERSIONS_KEEP']
+    projects = Project.query.filter(Project.version_count > keep).all()
+    return sum(compact_versions(p, keep) for p in projects)
+
+
+def compact_on_growth(project):
+    """Thin out the versions of a project every few new versions."""
+    keep = current_app.config['VERSIONS_KEEP']
+    if keep > 0 and project.version_count and \
+       project.version_count % keep == 0:
+        return compact_versions(project, keep)
+    return 0
+
+
+def find_version(project, number):
+    """Return the version by number, or the closest earlier one kept."""
+    ProjectVersion = version_class(Project)
+    return db.session.query(ProjectVersion).filter(
+        ProjectVersion.id == project.id,
+        ProjectVersion.version_count <= number,
+    ).order_by(ProjectVersion.version_count.desc()).first()
+
+
+def text_at_version(project, field, number):
+    """Rebuild a long text of a project as it was at a version."""
+    revisions = ProjectTextDelta.query.filter(
+        ProjectTextDelta.project_id == project.id,
+        ProjectTextDelta.field == field,
+        ProjectTextDelta.version <= number,
+    )
+    keyframe = revisions.filter(
+        ProjectTextDelta.is_keyframe.is_(True)
+    ).order_by(
+        ProjectTextDelta.version.desc(), ProjectTextDelta.id.desc()
+    ).first()
+    if keyframe is None:
+        return ''
+    text = unpack_text(keyframe.data)
+    deltas = revisions.filter(
+        ProjectTextDelta.id > keyframe.id
+    ).order_by(ProjectTextDelta.version, ProjectTextDelta.id)
+    for delta in deltas:
+        text = apply_delta(text, delta.data)
+    return text
+
+
+def revert_to_version(project, number):
+    """Restore the data of a project version, return it or None."""
+    version = find_version(project, number)
+    if version is None:
+        return None
+    version.revert()
+    # The texts of the version found, which may be older than the number
+    for field in TEXT_DELTA_FIELDS:
+        setattr(project, field,
+                text_at_version(project, field, version.version_count))
+    db.session.commit()
+    return version
@@ -1,4 +1,4 @@
-from os import environ as os_env
+from os import environ as os_env, listdir, path, remove
 
 forwarded_allow_ips = '*'
 secure_scheme_headers = {
@@ -10,3 +10,31 @@ bind = '0.0.0.0:%s' % str(os_env.get('PORT', 5000))
 worker_class = 'eventlet'
 workers = os_env.get('WORKERS', 2)
 errorlog = '-'
+
+# Build the app once in the master, and share its memory with the workers.
+# Parsed here, as importing dribdat would load it before it is patched.
+preload_app = os_env.get('PRELOAD_APP', 'False').lower() in (
+    'y', 'yes', 't', 'true', 'on', '1')
+
+
+def on_starting(server):
+    """Start the shared metrics of the workers from zero."""
+    metrics_dir = os_env.get('METRICS_DIR')
+    if metrics_dir and path.isdir(metrics_dir):
+        for filename in listdir(metrics_dir):
+            if filename.startswith('metrics-'):
+                remove(path.join(metrics_dir, filename))
+
+
+def when_ready(server):
+    """Prepare a preloaded app before the workers are forked."""
+    if server.cfg.preload_app:
+        from dribdat.app import warm_up
+        warm_up(server.app.wsgi())
+
+
+def post_fork(server, worker):
+    """Give each worker of a preloaded app its own connections."""
+    if server.cfg.preload_app:
+        from dribdat.app import init_worker
+        init_worker(worker.app.wsgi())
@@ -10,6 +10,7 @@ from dribdat.settings import DevConfig, ProdConfig
 
 HERE = os.path.abspath(os.path.dirname(__file__))
 TEST_PATH = os.path.join(HERE, 'tests')
+BENCH_PATH = os.path.join(HERE, 'benchmarks')
 
 
 def shell_context():
@@ -57,6 +58,19 @@ def test(name):
     return subprocess.call(['pytest', feat_test])
 
 
+@click.command()
+@click.argument('name', nargs=-1, required=False)
+def bench(name):
+    """Run all or just a subset of benchmarks."""
+    """Parameter: which benchmark set to run (hotpaths, boxout, ..)"""
+    if len(name):
+        feat_bench = os.path.join(BENCH_PATH, "test_%s.py" % name)
+    else:
+        feat_bench = BENCH_PATH
+    import subprocess
+    return subprocess.call(['pytest', '-q', feat_bench])
+
+
 @click.command()
 @click.argument('kind', nargs=-1, required=False)
 def socialize(kind):
@@ -69,6 +83,111 @@ def socialize(kind):
         print("Updated %d users." % len(q))
 
 
+@click.command()
+@click.option('--send', is_flag=True, help='Deliver queued messages now.')
+def mailq(send):
+    """Show or deliver the outgoing mail queue."""
+    from dribdat.mailer import deliver_queued, queue_status
+    app = create_app()
+    if send:
+        sent = total = deliver_queued(app)
+        while sent:
+            sent = deliver_queued(app)
+            total = total + sent
+        print("Delivered %d messages." % total)
+    for status, count in queue_status(app).items():
+        print("%s: %d" % (status, count))
+
+
+@click.command()
+@click.option('--refresh', is_flag=True, help='Fetch stored embeds again.')
+def embeds(refresh):
+    """Resolve the embeds in all project, event and category texts."""
+    from dribdat.database import db
+    from dribdat.extensions import cache
+    from dribdat.onebox import wait_embeds
+    from dribdat.user.models import Project, Event, Category, Embed
+    app = create_app()
+    with app.app_context():
+        if refresh:
+            Embed.query.delete()
+            db.session.commit()
+            cache.clear()
+        texts = [p.longtext for p in Project.query.all()]
+        texts += [e.description for e in Event.query.all()]
+        texts += [c.description for c in Category.query.all()]
+        # Render with the template filter, which schedules the embeds
+        onebox = app.jinja_env.filters['onebox']
+        for text in texts:
+            if text:
+                onebox(text)
+        wait_embeds()
+        print("Stored %d embeds." % Embed.query.count())
+
+
+@click.group()
+def versions():
+    """Manage the version history of projects."""
+    pass
+
+
+@versions.command()
+@click.option('--keep', type=int, default=None,
+              help='Latest versions to keep per project (VERSIONS_KEEP).')
+def compact(keep):
+    """Thin out the old versions of all projects."""
+    with create_app().app_context():
+        from dribdat.versioning import compact_all_versions
+        removed = compact_all_versions(keep)
+        print("Removed %d versions." % removed)
+
+
+@click.command()
+def precompile():
+    """Compile all templates into the bytecode cache."""
+    import time
+    from dribdat.app import precompile_templates
+    app = create_app()
+    if not app.config['JINJA_CACHE_DIR']:
+        print("Set JINJA_CACHE_DIR to keep compiled templates.")
+        return
+    started = time.perf_counter()
+    count = precompile_templates(app)
+    print("Compiled %d templates in %.1f ms." % (
+        count, (time.perf_counter() - started) * 1000))
+
+
+@click.command('startup-profile')
+@click.option('--limit', type=int, default=20,
+              help='Number of slowest modules to show.')
+def startup_profile(limit):
+    """Report the import time of each module loaded at startup."""
+    import sys
+    import subprocess
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c',
+         'from manage import create_app; create_app()'],
+        cwd=HERE, capture_output=True, text=True)
+    if proc.returncode != 0:
+        print(proc.stderr)
+        return proc.returncode
+    # Lines look like: "import time: self [us] | cumulative | module"
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if not fields[0].strip().isdigit():
+            continue
+        modules.append((int(fields[1]), int(fields[0]), fields[2].strip()))
+    modules.sort(reverse=True)
+    print("%10s %10s  %s" % ('total ms', 'self ms', 'module'))
+    for cumulative, own, name in modules[:limit]:
+        print("%10.1f %10.1f  %s" % (cumulative / 1000, own / 1000, name))
+    print("Imported %d modules in %.1f ms." % (
+        len(modules), sum(m[1] for m in modules) / 1000))
+
+
 @click.group(cls=FlaskGroup, create_app=create_app)
 def cli():
     """Script for managing this application."""
@@ -76,7 +195,13 @@ def cli():
 
 
 cli.add_command(test)
+cli.add_command(bench)
 cli.add_command(socialize)
+cli.add_command(mailq)
+cli.add_command(embeds)
+cli.add_command(versions)
+cli.add_command(precompile)
+cli.add_command(startup_profile)
 
 if __name__ == '__main__':
     cli()
@@ -0,0 +1,33 @@
+"""Add store of resolved embeds
+
+Revision ID: 3a9c1e5d7b20
+Revises: f5ee0fa5649b
+Create Date: 2026-10-19 10:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a9c1e5d7b20'
+down_revision = 'f5ee0fa5649b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('embeds',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('key', sa.String(length=64), nullable=False),
+    sa.Column('url', sa.String(length=2048), nullable=True),
+    sa.Column('html', sa.UnicodeText(), nullable=True),
+    sa.Column('fetched_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_embeds_key'), 'embeds', ['key'], unique=True)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_embeds_key'), table_name='embeds')
+    op.drop_table('embeds')
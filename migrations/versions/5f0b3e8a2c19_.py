@@ -0,0 +1,34 @@
+"""Link project text revisions to their project
+
+Revision ID: 5f0b3e8a2c19
+Revises: d4a9f3c6e817
+Create Date: 2026-10-19 18:05:42.318604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5f0b3e8a2c19'
+down_revision = 'd4a9f3c6e817'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Remove the revisions of projects which were deleted
+    op.execute(
+        'DELETE FROM project_text_deltas WHERE project_id NOT IN '
+        '(SELECT id FROM projects)'
+    )
+    with op.batch_alter_table('project_text_deltas') as batch_op:
+        batch_op.create_foreign_key(
+            'project_text_deltas_project_id_fkey', 'projects',
+            ['project_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade():
+    with op.batch_alter_table('project_text_deltas') as batch_op:
+        batch_op.drop_constraint(
+            'project_text_deltas_project_id_fkey', type_='foreignkey')
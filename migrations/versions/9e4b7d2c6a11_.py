@@ -0,0 +1,63 @@
+"""Add project excerpts
+
+Revision ID: 9e4b7d2c6a11
+Revises: 3a9c1e5d7b20
+Create Date: 2026-10-19 11:02:47.538201
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from markupsafe import Markup
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4b7d2c6a11'
+down_revision = '3a9c1e5d7b20'
+branch_labels = None
+depends_on = None
+
+# As in dribdat.user.constants
+MAX_EXCERPT_LENGTH = 500
+
+
+def shorten(text):
+    if len(text) > MAX_EXCERPT_LENGTH:
+        return text[:MAX_EXCERPT_LENGTH] + '...'
+    return text
+
+
+def upgrade():
+    for table in ('projects', 'projects_version'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column(
+                'excerpt', sa.UnicodeText(), nullable=True))
+            batch_op.add_column(sa.Column(
+                'excerpt_plain', sa.UnicodeText(), nullable=True))
+
+    # Backfill the excerpts of current projects, see Project.update_excerpt
+    conn = op.get_bind()
+    rows = conn.execute(sa.text(
+        'SELECT id, longtext, autotext, autotext_url FROM projects'
+    )).fetchall()
+    for row in rows:
+        text = ''
+        if row.longtext and len(row.longtext) > 10:
+            text = row.longtext
+        elif row.autotext_url and row.autotext_url.strip():
+            if row.autotext and len(row.autotext) > 10:
+                text = row.autotext
+        conn.execute(sa.text(
+            'UPDATE projects SET excerpt = :excerpt, '
+            'excerpt_plain = :excerpt_plain WHERE id = :id'
+        ), {
+            'id': row.id,
+            'excerpt': shorten(text),
+            'excerpt_plain': shorten(Markup(text).striptags()),
+        })
+
+
+def downgrade():
+    for table in ('projects', 'projects_version'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('excerpt_plain')
+            batch_op.drop_column('excerpt')
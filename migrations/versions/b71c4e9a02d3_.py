@@ -0,0 +1,42 @@
+"""Add project version counter
+
+Revision ID: b71c4e9a02d3
+Revises: 9e4b7d2c6a11
+Create Date: 2026-10-19 15:24:10.912337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b71c4e9a02d3'
+down_revision = '9e4b7d2c6a11'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('projects', 'projects_version'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column(
+                'version_count', sa.Integer(), nullable=True))
+
+    # Number the existing versions in the order they were made
+    op.execute(
+        'UPDATE projects_version SET version_count = ('
+        'SELECT COUNT(*) FROM projects_version AS v '
+        'WHERE v.id = projects_version.id '
+        'AND v.transaction_id <= projects_version.transaction_id)'
+    )
+    op.execute(
+        'UPDATE projects SET version_count = ('
+        'SELECT COUNT(*) FROM projects_version AS v '
+        'WHERE v.id = projects.id)'
+    )
+
+
+def downgrade():
+    for table in ('projects', 'projects_version'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('version_count')
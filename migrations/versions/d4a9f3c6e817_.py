@@ -0,0 +1,155 @@
+"""Store project text revisions as deltas
+
+Revision ID: d4a9f3c6e817
+Revises: b71c4e9a02d3
+Create Date: 2026-10-19 16:40:55.204719
+
+"""
+import json
+import zlib
+from difflib import SequenceMatcher
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a9f3c6e817'
+down_revision = 'b71c4e9a02d3'
+branch_labels = None
+depends_on = None
+
+# As in dribdat.textdelta
+KEYFRAME_INTERVAL = 20
+FIELDS = ('longtext', 'autotext')
+
+
+def pack_text(text):
+    return zlib.compress((text or '').encode('utf-8'))
+
+
+def unpack_text(data):
+    return zlib.decompress(data).decode('utf-8')
+
+
+def make_delta(old, new):
+    old_lines = (old or '').splitlines(True)
+    new_lines = (new or '').splitlines(True)
+    ops = []
+    matcher = SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([i1, i2])
+        elif tag in ('replace', 'insert'):
+            ops.append(''.join(new_lines[j1:j2]))
+    return zlib.compress(json.dumps(ops).encode('utf-8'))
+
+
+def apply_delta(old, data):
+    old_lines = (old or '').splitlines(True)
+    parts = []
+    for op_ in json.loads(zlib.decompress(data).decode('utf-8')):
+        if isinstance(op_, list):
+            parts.extend(old_lines[op_[0]:op_[1]])
+        else:
+            parts.append(op_)
+    return ''.join(parts)
+
+
+def upgrade():
+    deltas = op.create_table(
+        'project_text_deltas',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('project_id', sa.Integer(), nullable=False),
+        sa.Column('field', sa.String(length=20), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('is_keyframe', sa.Boolean(), nullable=True),
+        sa.Column('data', sa.LargeBinary(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_project_text_deltas_project_id'),
+                    'project_text_deltas', ['project_id'], unique=False)
+
+    # Encode the texts of the existing versions
+    conn = op.get_bind()
+    rows = conn.execute(sa.text(
+        'SELECT id, version_count, longtext, autotext '
+        'FROM projects_version ORDER BY id, transaction_id'
+    )).fetchall()
+    last = {}
+    for row in rows:
+        for field in FIELDS:
+            text = getattr(row, field) or ''
+            key = (row.id, field)
+            if key not in last:
+                if not text:
+                    continue
+                is_keyframe = True
+            elif last[key][0] == text:
+                continue
+            else:
+                is_keyframe = last[key][1] >= KEYFRAME_INTERVAL
+            if is_keyframe:
+                data = pack_text(text)
+                since = 0
+            else:
+                data = make_delta(last[key][0], text)
+                since = last[key][1] + 1
+            last[key] = (text, since)
+            conn.execute(deltas.insert().values(
+                project_id=row.id,
+                field=field,
+                version=row.version_count or 1,
+                is_keyframe=is_keyframe,
+                data=data,
+                created_at=datetime.utcnow(),
+            ))
+
+    with op.batch_alter_table('projects_version') as batch_op:
+        batch_op.drop_column('longtext')
+        batch_op.drop_column('autotext')
+
+
+def downgrade():
+    with op.batch_alter_table('projects_version') as batch_op:
+        batch_op.add_column(sa.Column(
+            'autotext', sa.UnicodeText(), nullable=True))
+        batch_op.add_column(sa.Column(
+            'longtext', sa.UnicodeText(), nullable=True))
+
+    # Rebuild the full texts of each version
+    conn = op.get_bind()
+    revisions = conn.execute(sa.text(
+        'SELECT project_id, field, version, is_keyframe, data '
+        'FROM project_text_deltas ORDER BY project_id, field, version, id'
+    )).fetchall()
+    history = {}
+    text = {}
+    for rev in revisions:
+        key = (rev.project_id, rev.field)
+        if rev.is_keyframe:
+            text[key] = unpack_text(rev.data)
+        else:
+            text[key] = apply_delta(text.get(key, ''), rev.data)
+        history.setdefault(key, []).append((rev.version, text[key]))
+    versions = conn.execute(sa.text(
+        'SELECT id, transaction_id, version_count FROM projects_version'
+    )).fetchall()
+    for row in versions:
+        values = {}
+        for field in FIELDS:
+            values[field] = ''
+            for number, value in history.get((row.id, field), []):
+                if number <= (row.version_count or 1):
+                    values[field] = value
+        conn.execute(sa.text(
+            'UPDATE projects_version SET longtext = :longtext, '
+            'autotext = :autotext '
+            'WHERE id = :id AND transaction_id = :transaction_id'
+        ), dict(values, id=row.id, transaction_id=row.transaction_id))
+
+    op.drop_index(op.f('ix_project_text_deltas_project_id'),
+                  table_name='project_text_deltas')
+    op.drop_table('project_text_deltas')
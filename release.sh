@@ -14,3 +14,6 @@ python -m whitenoise.compress dribdat/static/js
 python -m whitenoise.compress dribdat/static/css
 python -m whitenoise.compress dribdat/static/img
 python -m whitenoise.compress dribdat/static/public
+
+# Compile templates
+python manage.py precompile
@@ -68,3 +68,15 @@ def project(db):
     project = ProjectFactory()
     db.session.commit()
     return project
+
+
+@pytest.fixture
+def login(testapp):
+    """Provide a helper which logs in through the login form."""
+    def login_user(user, password='myprecious'):
+        res = testapp.get('/login/')
+        form = res.forms['loginForm']
+        form['username'] = user.username
+        form['password'] = password
+        return form.submit()
+    return login_user
@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 """Dribdat data aggregation tests."""
 
-from dribdat.aggregation import GetProjectData
+from dribdat.aggregation import GetProjectData, SyncProjectData
+
+from .factories import ProjectFactory
 
 
 class TestAggregate:
@@ -45,3 +47,20 @@ class TestAggregate:
         assert test_obj['name'] == 'dribdat'
         assert test_obj['type'] == 'Bitbucket'
         # TODO: support for commits
+
+    def test_sync_unchanged(self, db):
+        """Skip saving a sync which changes nothing."""
+        project = ProjectFactory()
+        project.save()
+        data = {
+            'description': 'A remote readme',
+            'homepage_url': 'https://example.com/home',
+        }
+        versions = project.versions.count()
+        assert SyncProjectData(project, data)
+        assert project.autotext == 'A remote readme'
+        assert project.versions.count() == versions + 1
+        updated_at = project.updated_at
+        assert not SyncProjectData(project, data)
+        assert project.versions.count() == versions + 1
+        assert project.updated_at == updated_at
@@ -1,7 +1,13 @@
 # -*- coding: utf-8 -*-
 """Test configs."""
 
-from dribdat.app import init_app
+import sys
+import subprocess
+from dribdat.app import (
+    init_app, init_mailman, warm_up, init_worker, register_templates,
+    precompile_templates,
+)
+from dribdat.metrics import metrics
 from dribdat.settings import DevConfig, ProdConfig
 from dribdat.utils import strtobool
 
@@ -23,7 +29,47 @@ def test_dev_config():
     assert app.config['ASSETS_DEBUG'] is True
 
 
+def test_preload_app(app):
+    """Prepare a preloaded app and reset it in a worker."""
+    warm_up(app)
+    assert app.oembed_providers is not None
+    assert len(app.jinja_env.cache) > 0
+    metrics.inc('dribdat_requests_total')
+    init_worker(app)
+    assert metrics.counters == {}
+
+
+def test_mail_worker_start(app, monkeypatch):
+    """Start delivering the mail queue with the app and its workers."""
+    started = []
+    monkeypatch.setattr('dribdat.app.start_worker', started.append)
+    app.config['MAIL_SERVER'] = 'localhost'
+    app.config['MAIL_DEFAULT_SENDER'] = 'dribdat@localhost'
+    init_mailman(app)
+    init_worker(app)
+    assert started == [app, app]
+
+
+def test_template_cache(app, tmp_path):
+    """Keep the compiled templates on disk."""
+    app.config['JINJA_CACHE_DIR'] = str(tmp_path / 'jinja')
+    register_templates(app)
+    count = precompile_templates(app)
+    assert count > 0
+    assert len(list((tmp_path / 'jinja').iterdir())) == count
+
+
 def test_truthy_config():
     """ Test conversion of truthy variables. """
     assert strtobool(' tRuE') is True
     assert strtobool('0') is False
+
+
+def test_lazy_imports():
+    """Heavy optional modules are not loaded at startup."""
+    heavy = ['frictionless', 'boto3', 'micawber', 'pyquery', 'bleach',
+             'pystache', 'flask_dance']
+    code = 'import sys; from dribdat.app import init_app; init_app(); ' \
+        'print(" ".join(sorted(sys.modules)))'
+    loaded = subprocess.check_output([sys.executable, '-c', code], text=True)
+    assert set(heavy).isdisjoint(loaded.split())
@@ -3,10 +3,21 @@
 
 See: http://webtest.readthedocs.org/
 """
+import os
+import json
+from datetime import datetime
 from flask import url_for
-from .factories import ProjectFactory, EventFactory
+from sqlalchemy import event as sa_event
+from flask_mailman import Mail
+from .factories import ProjectFactory, EventFactory, UserFactory
 from dribdat.onebox import make_onebox
 from dribdat.public.projhelper import resources_by_stage, project_action
+from dribdat.apifetch import FetchWebProject
+from dribdat.extensions import cache
+from dribdat.metrics import metrics
+from dribdat.aggregation import ProjectActivity
+from dribdat.mailer import user_activation, deliver_queued, queue_status
+from dribdat.user.models import Role, Project
 
 
 class TestProjects:
@@ -33,8 +44,13 @@ EOF""" % (url, url)
         assert 'example' in project.data['name']
         assert project.data['excerpt'] == ''
         project.autotext_url = 'https:/...'
+        project.save()
         assert 'test' in project.autotext
         assert 'test' in project.data['excerpt']
+        project.longtext = '<b>Longer</b> test content'
+        project.save()
+        assert project.data['excerpt'].startswith('<b>Longer')
+        assert project.excerpt_plain == 'Longer test content'
 
     def test_project_stage(self, project, testapp):
         """Check stage progression."""
@@ -52,4 +68,205 @@ EOF""" % (url, url)
         assert project.is_challenge
         project.save()
         assert len(resources_by_stage(0)) == 1
+        assert resources_by_stage(0)[0]['name'] == 'example resource'
+        # As saved by another worker, which does not clear this cache
+        Project.query.filter_by(id=project.id).update({
+            'name': 'renamed resource',
+            'version_count': Project.version_count + 1})
+        assert resources_by_stage(0)[0]['name'] == 'renamed resource'
         assert project_action(project.id)
+        project.is_hidden = True
+        project.save()
+        assert resources_by_stage(0) == []
+        project.is_hidden = False
+        project.save()
+        event.lock_resources = False
+        event.save()
+        assert resources_by_stage(0) == []
+
+    def test_project_page(self, db, user, testapp, login):
+        """Show the team and cached texts of a project page."""
+        project = ProjectFactory(
+            event=EventFactory(), summary='', longtext='**First** version')
+        project.save()
+        ProjectActivity(project, 'star', user)
+        Role(name='Tester').save()
+        login(user)
+        url = url_for('project.project_view', project_id=project.id)
+        res = testapp.get(url)
+        assert 'First</strong> version' in res
+        assert 'name="description" content="**First** version"' in res
+        assert 'widget-team' in res
+        assert 'Tester' in res
+        project.longtext = 'Second version'
+        project.save()
+        res = testapp.get(url)
+        assert 'Second version' in res
+        # As saved by another worker, which does not clear this cache
+        Project.query.filter_by(id=project.id).update({
+            'longtext': 'Third version',
+            'version_count': Project.version_count + 1})
+        db.session.commit()
+        res = testapp.get(url)
+        assert 'Third version' in res
+
+    def test_event_print(self, event, testapp):
+        """Print the stored excerpts of the projects."""
+        project = ProjectFactory(
+            event=event, summary='', longtext='<b>Long</b> story')
+        project.save()
+        res = testapp.get(url_for('public.event_print', event_id=event.id))
+        assert 'Long story' in res
+
+    def test_project_fields(self, event, testapp):
+        """Select some fields of the project and activity lists."""
+        low = ProjectFactory(event=event, score=1)
+        low.save()
+        high = ProjectFactory(event=event, score=5)
+        high.save()
+        ProjectActivity(low, 'update', UserFactory(), 'post', 'Hello')
+        res = testapp.get(
+            '/api/event/%d/projects.json' % event.id,
+            {'fields': 'id,name,score,nonsense'})
+        assert res.json['projects'] == [
+            {'id': high.id, 'name': high.name, 'score': high.score},
+            {'id': low.id, 'name': low.name, 'score': low.score},
+        ]
+        res = testapp.get(
+            '/api/project/%d/activity.json' % low.id,
+            {'fields': 'content,timestamp'})
+        activity = res.json['activities'][0]
+        assert sorted(activity.keys()) == ['content', 'timestamp']
+        assert activity['content'] == 'Hello'
+
+
+class TestHome:
+    """Home page."""
+
+    def test_home_events(self, user, testapp, login):
+        """Refresh the cached event lists, but not the teams box."""
+        event = EventFactory(name='First event')
+        event.save()
+        res = testapp.get(url_for('public.home'))
+        assert 'First event' in res
+        assert 'My teams' not in res
+        other = EventFactory(name='Second event')
+        other.save()
+        project = ProjectFactory(event=event, name='My project')
+        project.save()
+        ProjectActivity(project, 'star', user)
+        login(user)
+        res = testapp.get(url_for('public.home'))
+        assert 'Second event' in res
+        assert 'My teams' in res
+        assert 'My project' in res
+        other.delete()
+        res = testapp.get(url_for('public.home'))
+        assert 'Second event' not in res
+
+    def test_event_history(self, db, testapp):
+        """List past events with their descriptions in one query."""
+        queries = []
+
+        def count_query(*args):
+            queries.append(args)
+
+        counts = []
+        for size in (1, 4):
+            for i in range(size):
+                EventFactory(
+                    summary='', description='Looking back %d' % i,
+                    starts_at=datetime(2020, 1, 1),
+                    ends_at=datetime(2020, 1, 2),
+                ).save()
+            db.session.expunge_all()
+            sa_event.listen(db.engine, 'before_cursor_execute', count_query)
+            res = testapp.get(url_for('public.events_past'))
+            sa_event.remove(db.engine, 'before_cursor_execute', count_query)
+            assert 'Looking back 0' in res
+            counts.append(len(queries))
+            queries.clear()
+        assert counts[0] == counts[1]
+
+
+class TestMetrics:
+    """Operational metrics."""
+
+    def test_metrics(self, project, testapp):
+        """Expose request, cache and fetch metrics."""
+        testapp.get(url_for('public.home'))
+        cache.get('no-such-key')
+        assert FetchWebProject('not a url') == {}
+        res = testapp.get('/metrics')
+        assert res.content_type == 'text/plain'
+        assert 'dribdat_request_duration_seconds_count' \
+            '{endpoint="public.home"}' in res.text
+        assert 'dribdat_requests_total' \
+            '{endpoint="public.home",status="200"}' in res.text
+        assert 'dribdat_cache_requests_total{result="miss"}' in res.text
+        assert 'dribdat_fetch_errors_total{provider="web"}' in res.text
+
+    def test_shared_metrics(self, db, testapp, tmp_path):
+        """Add up the metrics saved by other worker processes."""
+        metrics.reset()
+        metrics.share(str(tmp_path))
+        (tmp_path / 'metrics-1.json').write_text(json.dumps({
+            'counters': [['dribdat_requests_total',
+                          [['endpoint', 'public.about'], ['status', 200]],
+                          40]],
+            'histograms': [],
+        }))
+        testapp.get(url_for('public.about'))
+        res = testapp.get('/metrics')
+        metrics.share(None)
+        assert 'dribdat_requests_total' \
+            '{endpoint="public.about",status="200"} 41' in res.text
+
+    def test_throttled_metrics(self, tmp_path):
+        """Save the shared metrics at most once per interval."""
+        metrics.reset()
+        metrics.share(str(tmp_path))
+        path = tmp_path / ('metrics-%d.json' % os.getpid())
+        metrics.inc('dribdat_requests_total')
+        metrics.save()
+        metrics.inc('dribdat_requests_total')
+        metrics.save()
+        saved = json.loads(path.read_text())
+        assert saved['counters'][0][2] == 1
+        metrics.save(force=True)
+        metrics.share(None)
+        saved = json.loads(path.read_text())
+        assert saved['counters'][0][2] == 2
+
+
+class TestMailer:
+    """Outgoing mail queue."""
+
+    def test_mail_queue(self, user, app, tmp_path):
+        """Queue an activation mail and deliver it."""
+        app.config['MAIL_SPOOL'] = str(tmp_path)
+        mailman = Mail().init_app(app)
+        user_activation(app, user)
+        assert queue_status(app)['queued'] == 1
+        assert deliver_queued(app) == 1
+        # Nothing is kept of the sent message
+        assert not any(queue_status(app).values())
+        assert not (tmp_path / 'sent').exists()
+        assert len(mailman.outbox) == 1
+        assert mailman.outbox[0].to == [user.email]
+        assert 'activate' in mailman.outbox[0].body
+
+    def test_mail_retry(self, user, app, tmp_path):
+        """Retry and finally give up when the server is unreachable."""
+        app.config['MAIL_SPOOL'] = str(tmp_path)
+        app.config['MAIL_QUEUE_INTERVAL'] = 0
+        app.config['MAIL_MAX_RETRIES'] = 2
+        app.config['MAIL_BACKEND'] = 'smtp'
+        app.config['MAIL_SERVER'] = 'localhost'
+        app.config['MAIL_PORT'] = 1
+        Mail().init_app(app)
+        user_activation(app, user)
+        assert deliver_queued(app) == 0
+        assert queue_status(app)['queued'] == 1
+        assert deliver_queued(app) == 0
+        assert queue_status(app)['failed'] == 1
@@ -3,9 +3,11 @@
 
 See: http://webtest.readthedocs.org/
 """
-from flask import url_for
+from flask import url_for, session
 
-from dribdat.user.models import User
+from dribdat.extensions import MeteredCache
+from dribdat.user.models import User, Role
+from dribdat.public.auth import load_user, remember_user, cached_user
 
 from .factories import UserFactory
 
@@ -38,6 +40,32 @@ class TestLoggingIn:
         # sees alert
         assert 'You are logged out.' in res
 
+    def test_user_snapshot(self, user, db, monkeypatch):
+        """Keep the logged in user in the session until it changes."""
+        # Not with a cache of each process, which other workers cannot bump
+        load_user(user.id)
+        assert 'user_snapshot' not in session
+        monkeypatch.setattr(MeteredCache, 'is_shared', True)
+        remember_user(user)
+        user_id, username = user.id, user.username
+        # Changes outside of the models are not seen
+        db.session.execute(
+            User.__table__.update().values(username='renamed'))
+        db.session.commit()
+        db.session.expunge_all()
+        assert cached_user(user_id).username == username
+        # Saving the user refreshes the snapshot
+        db.session.expunge_all()
+        user = User.query.first()
+        user.roles.append(Role(name='Tester'))
+        user.save()
+        assert cached_user(user_id) is None
+        db.session.expunge_all()
+        user = load_user(user_id)
+        assert user.username == 'renamed'
+        db.session.expunge_all()
+        assert [r.name for r in cached_user(user_id).roles] == ['Tester']
+
     def test_sees_error_message_if_password_is_incorrect(self, user, testapp):
         """Show error if password is incorrect."""
         # Goes to homepage
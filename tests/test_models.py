@@ -2,17 +2,28 @@
 """Model unit tests."""
 
 import datetime as dt
+import importlib.util
+import os
 
 import pytest
 import pytz
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+from sqlalchemy import event as sa_event, text as sa_text
 
-from dribdat.user.models import Role, User, Event
+from dribdat.user.models import (
+    Role, User, Event, Activity, ProjectTextDelta, counts_by_event,
+)
 from dribdat.utils import timesince
 from dribdat.settings import Config
-from dribdat.aggregation import ProjectActivity
+from dribdat.aggregation import ProjectActivity, GetEventUsers
 from dribdat.boxout.dribdat import box_project
+from dribdat.versioning import (
+    compact_versions, revert_to_version, text_at_version,
+)
+from dribdat.textdelta import KEYFRAME_INTERVAL
 
-from .factories import UserFactory, ProjectFactory
+from .factories import UserFactory, ProjectFactory, EventFactory
 
 
 @pytest.mark.usefixtures('db')
@@ -119,6 +130,58 @@ class TestEvent:
         assert timesince(
             event.countdown, until=True) == "%d hours to go" % timediff_hours
 
+    def test_event_users(self, db):
+        """List each participant of an event once."""
+        event = EventFactory()
+        event.save()
+        assert GetEventUsers(event) == []
+        alice = UserFactory(username='alice')
+        bob = UserFactory(username='bob')
+        for i in range(2):
+            project = ProjectFactory(event=event)
+            project.save()
+            ProjectActivity(project, 'star', bob)
+            ProjectActivity(project, 'star', alice)
+        other = ProjectFactory(event=EventFactory())
+        other.save()
+        ProjectActivity(other, 'star', UserFactory())
+        assert GetEventUsers(event) == [alice, bob]
+
+    def test_project_count(self, db):
+        """Count the projects of events in one query."""
+        event = EventFactory()
+        event.save()
+        empty = EventFactory()
+        empty.save()
+        for i in range(3):
+            ProjectFactory(event=event).save()
+        assert event.project_count == 3
+        assert counts_by_event([event, empty]) == {event.id: 3, empty.id: 0}
+        assert empty.project_count == 0
+
+    def test_current_event(self, db):
+        """Keep the featured event until the events change."""
+        assert Event.current() is None
+        event = EventFactory(name='First', is_current=True)
+        event.save()
+        assert Event.current().id == event.id
+        db.session.expunge_all()
+        queries = []
+
+        def count_query(*args):
+            queries.append(args)
+
+        sa_event.listen(db.engine, 'before_cursor_execute', count_query)
+        current = Event.current()
+        assert current.name == 'First'
+        sa_event.remove(db.engine, 'before_cursor_execute', count_query)
+        assert queries == []
+        other = EventFactory(name='Second', is_current=True)
+        current.is_current = False
+        current.save()
+        other.save()
+        assert Event.current().name == 'Second'
+
 
 @pytest.mark.usefixtures('db')
 class TestProject:
@@ -143,6 +206,147 @@ class TestProject:
         assert project.name != TEST_NAME
         assert project.versions.count() == 3
 
+    def test_project_versions(self, db):
+        """Number, thin out and revert project versions."""
+        now = dt.datetime.utcnow()
+        event = EventFactory(
+            starts_at=now - dt.timedelta(days=2),
+            ends_at=now - dt.timedelta(days=1))
+        project = ProjectFactory(event=event, name='Version 1')
+        project.save()
+        for i in range(2, 7):
+            project.name = 'Version %d' % i
+            project.save()
+        assert project.version_count == 6
+        assert compact_versions(project, keep=2) == 3
+        numbers = [v.version_count for v in project.versions]
+        # The last of the day, and the latest two
+        assert numbers == [4, 5, 6]
+        assert project.versions[0].next.version_count == 5
+        assert revert_to_version(project, 3) is None
+        assert revert_to_version(project, 4).version_count == 4
+        assert project.name == 'Version 4'
+        assert project.version_count == 7
+        # Versions are kept while the event is running
+        event.ends_at = now + dt.timedelta(days=1)
+        event.save()
+        assert compact_versions(project, keep=1) == 0
+
+    def test_project_version_count(self, db):
+        """Count one version per transaction which makes one."""
+        project = ProjectFactory(name='Version 1')
+        project.save()
+        for i in range(2, 5):
+            project.name = 'Version %d' % i
+            # Computing the score flushes the project once already
+            project.update()
+            project.save()
+            assert project.version_count == i
+        assert project.versions.count() == 4
+        project.name = 'Version 5'
+        db.session.flush()
+        project.summary = 'Flushed twice'
+        db.session.flush()
+        db.session.commit()
+        assert project.version_count == 5
+        assert project.versions.count() == 5
+        # Changes to the long texts alone are versions too
+        project.longtext = 'Only the text'
+        project.save()
+        assert project.version_count == 6
+        numbers = [v.version_count for v in project.versions]
+        assert numbers == [1, 2, 3, 4, 5, 6]
+
+    def test_project_text_deltas(self, db):
+        """Store text revisions as deltas and rebuild them."""
+        lines = ['Line %d of a long readme\n' % i for i in range(500)]
+        project = ProjectFactory(longtext=''.join(lines))
+        project.save()
+        texts = {project.version_count: project.longtext}
+        for i in range(KEYFRAME_INTERVAL + 5):
+            lines[i * 7] = 'Edit %d\n' % i
+            project.longtext = ''.join(lines)
+            project.save()
+            texts[project.version_count] = project.longtext
+        for number, text in texts.items():
+            assert text_at_version(project, 'longtext', number) == text
+        revisions = ProjectTextDelta.query.filter_by(
+            project_id=project.id, field='longtext').all()
+        assert len(revisions) == len(texts)
+        assert len([r for r in revisions if r.is_keyframe]) == 2
+        # Deltas are much smaller than the text
+        delta = [r for r in revisions if not r.is_keyframe][0]
+        assert len(delta.data) * 20 < len(project.longtext)
+        first = min(texts)
+        assert revert_to_version(project, first)
+        assert project.longtext == texts[first]
+
+    def test_revert_compacted_texts(self, db):
+        """Revert the texts along with the closest version kept."""
+        now = dt.datetime.utcnow()
+        event = EventFactory(
+            starts_at=now - dt.timedelta(days=5),
+            ends_at=now - dt.timedelta(days=4))
+        project = ProjectFactory(event=event, longtext='Text 1')
+        project.save()
+        for i in range(2, 6):
+            project.longtext = 'Text %d' % i
+            project.save()
+        # Versions 2 and 3 were made on the same day
+        for version in project.versions:
+            days = 3 if version.version_count in (2, 3) else 1
+            version.transaction.issued_at = now - dt.timedelta(
+                days=days, minutes=5 - version.version_count)
+        db.session.commit()
+        assert compact_versions(project, keep=2) == 1
+        numbers = [v.version_count for v in project.versions]
+        assert numbers == [1, 3, 4, 5]
+        # The texts are only kept for the versions kept
+        revisions = ProjectTextDelta.query.filter_by(
+            project_id=project.id, field='longtext').all()
+        assert [r.version for r in revisions] == numbers
+        assert revisions[0].is_keyframe
+        for number in numbers:
+            text = text_at_version(project, 'longtext', number)
+            assert text == 'Text %d' % number
+        assert revert_to_version(project, 2).version_count == 1
+        assert project.longtext == 'Text 1'
+        project.delete()
+        assert ProjectTextDelta.query.filter_by(
+            project_id=project.id).count() == 0
+
+    def test_text_delta_migration(self, db):
+        """Keep the text of each version through the delta migration."""
+        project = ProjectFactory(longtext='First\n')
+        project.update()
+        project.save()
+        texts = {project.version_count: project.longtext}
+        for i in range(2, 6):
+            if i != 3:
+                project.longtext = texts[i - 1] + 'Line %d\n' % i
+            project.name = 'Version %d' % i
+            project.update()
+            project.save()
+            texts[project.version_count] = project.longtext
+        assert sorted(texts) == [1, 2, 3, 4, 5]
+        db.session.close()
+        path = os.path.join(os.path.dirname(__file__), '..', 'migrations',
+                            'versions', 'd4a9f3c6e817_.py')
+        spec = importlib.util.spec_from_file_location('migration', path)
+        migration = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(migration)
+        with db.engine.begin() as connection:
+            context = MigrationContext.configure(connection)
+            with Operations.context(context):
+                migration.downgrade()
+                rows = connection.execute(sa_text(
+                    'SELECT version_count, longtext FROM projects_version'
+                )).fetchall()
+                assert dict(rows) == texts
+                migration.upgrade()
+        for number, text in texts.items():
+            assert text_at_version(project, 'longtext', number) == text
+
     def test_project_roles(self, db):
         """Test role factory."""
         project = ProjectFactory()
@@ -157,6 +361,42 @@ class TestProject:
         ProjectActivity(project, 'star', user)
         assert role2 in project.get_missing_roles()
 
+    def test_project_dribs(self, db):
+        """Build, cache and refresh the project timeline."""
+        now = dt.datetime.utcnow()
+        event = EventFactory(
+            starts_at=now - dt.timedelta(days=2),
+            ends_at=now - dt.timedelta(days=1))
+        project = ProjectFactory(event=event)
+        project.save()
+        user = UserFactory()
+        ProjectActivity(project, 'star', user)
+        dribs = project.all_dribs()
+        assert [d['name'] for d in dribs] == ['star', 'finish', 'start']
+        ProjectActivity(project, 'update', user, 'post', 'Hello')
+        dribs = project.all_dribs()
+        assert [d['name'] for d in dribs] == [
+            'update', 'star', 'finish', 'start']
+        assert dribs[0]['text'] == 'Hello'
+        # As removed by another process, without clearing this cache
+        Activity.query.filter_by(name='update').delete()
+        dribs = project.all_dribs()
+        assert [d['name'] for d in dribs] == ['star', 'finish', 'start']
+
+    def test_joined_projects(self, db):
+        """List the projects a user joined, latest first."""
+        user = UserFactory()
+        challenge = ProjectFactory(progress=0)
+        hidden = ProjectFactory(is_hidden=True)
+        first = ProjectFactory(progress=10)
+        second = ProjectFactory(progress=10)
+        for project in [challenge, hidden, first, second]:
+            project.save()
+            ProjectActivity(project, 'star', user)
+        assert user.joined_projects() == [second, first, challenge]
+        assert user.joined_projects(False) == [second, first]
+        assert user.joined_projects(True, 1) == [second]
+
     def tests_project_box(self, db):
         """Test boxed (embedded) projects."""
         project = ProjectFactory()
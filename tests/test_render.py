@@ -3,6 +3,23 @@
 
 from dribdat.boxout.datapackage import box_datapackage
 from dribdat.boxout.ckan import box_dataset
+from dribdat.onebox import make_oembedplus, wait_embeds
+from dribdat.user.models import Embed
+from dribdat.extensions import cache
+from micawber.providers import ProviderRegistry
+
+
+class FakeProvider(object):
+    """An oEmbed provider which answers without a network request."""
+
+    def __init__(self):
+        """Start without requests."""
+        self.requests = 0
+
+    def request(self, url, **params):
+        """Count the request and answer with a video embed."""
+        self.requests = self.requests + 1
+        return {'type': 'video', 'url': url, 'html': '<iframe></iframe>'}
 
 
 class TestRender:
@@ -20,3 +37,19 @@ class TestRender:
         test_url = 'https://opendata.swiss/de/dataset/21st-century-swiss-video-games'  # noqa: E501
         dpkg_html = box_dataset(test_url)
         assert "boxout" in dpkg_html
+
+    def test_oembed_deferred(self, db, testapp):
+        """Resolve an oEmbed in the background, then render it."""
+        provider = FakeProvider()
+        providers = ProviderRegistry()
+        providers.register(r'https://video\.example/.+', provider)
+        text = 'My video:\nhttps://video.example/1'
+        assert make_oembedplus(text, providers) == text
+        wait_embeds()
+        assert '<iframe></iframe>' in make_oembedplus(text, providers)
+        assert provider.requests == 1
+        # Other processes find the embed in the database
+        cache.clear()
+        assert '<iframe></iframe>' in make_oembedplus(text, providers)
+        assert provider.requests == 1
+        assert Embed.query.count() == 1